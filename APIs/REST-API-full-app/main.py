@@ -10,9 +10,9 @@ import uuid
 import jwt
 from pathlib import Path
 from passlib.context import CryptContext
-from sqlalchemy import create_engine, Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, inspect, text, update, Column, String, DateTime, ForeignKey, Index, Integer, Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, joinedload
 import os
 
 # Configuration
@@ -71,14 +71,21 @@ class DBTopic(Base):
     description = Column(Text)
     created_by_id = Column(String(36), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # kept up to date by every route that adds comments, so sort=most_active
+    # walks an index instead of counting the comments table
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_by = relationship("DBUser", back_populates="topics")
     comments = relationship("DBComment", back_populates="topic")
+    __table_args__ = (
+        Index("ix_topics_created_at_id", "created_at", "id"),
+        Index("ix_topics_comment_count_created_at_id", "comment_count", "created_at", "id"),
+    )
 
 class DBComment(Base):
     __tablename__ = "comments"
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     content = Column(Text)
-    topic_id = Column(String(36), ForeignKey("topics.id"))
+    topic_id = Column(String(36), ForeignKey("topics.id"), index=True)
     created_by_id = Column(String(36), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -266,17 +273,16 @@ async def list_topics(
     offset = (page - 1) * limit
     total = db.query(DBTopic).count()
     
-    query = db.query(DBTopic)
-    if sort == "newest":
-        query = query.order_by(DBTopic.created_at.desc())
-    elif sort == "most_active":
-        query = query.order_by(DBTopic.created_at.desc())
+    # Both sorts walk an index on topics; comment counts are a column, so
+    # the comments table isn't read at all
+    query = db.query(DBTopic).options(joinedload(DBTopic.created_by))
+    if sort == "most_active":
+        query = query.order_by(DBTopic.comment_count.desc(), DBTopic.created_at.desc(), DBTopic.id.desc())
+    else:
+        query = query.order_by(DBTopic.created_at.desc(), DBTopic.id.desc())
     
     topics = query.offset(offset).limit(limit).all()
     
-    for topic in topics:
-        topic.comment_count = db.query(DBComment).filter(DBComment.topic_id == topic.id).count()
-    
     return {
         "topics": topics,
         "total": total,
@@ -295,7 +301,6 @@ async def create_topic(
     db.add(db_topic)
     db.commit()
     db.refresh(db_topic)
-    db_topic.comment_count = 0
     return db_topic
 
 @app.get("/topics/{topic_id}", response_model=Topic)
@@ -306,8 +311,6 @@ async def get_topic(
     topic = db.query(DBTopic).filter(DBTopic.id == str(topic_id)).first()
     if topic is None:
         raise HTTPException(status_code=404, detail="Topic not found")
-    
-    topic.comment_count = db.query(DBComment).filter(DBComment.topic_id == str(topic_id)).count()
     return topic
 
 # Comment endpoints
@@ -326,7 +329,11 @@ async def list_comments(
     offset = (page - 1) * limit
     total = db.query(DBComment).filter(DBComment.topic_id == str(topic_id)).count()
     
-    query = db.query(DBComment).filter(DBComment.topic_id == str(topic_id))
+    query = (
+        db.query(DBComment)
+        .filter(DBComment.topic_id == str(topic_id))
+        .options(joinedload(DBComment.created_by))
+    )
     if sort == "newest":
         query = query.order_by(DBComment.created_at.desc())
     elif sort == "oldest":
@@ -359,10 +366,29 @@ async def create_comment(
         created_by_id=current_user.id
     )
     db.add(db_comment)
+    db.execute(
+        update(DBTopic)
+        .where(DBTopic.id == str(topic_id))
+        .values(comment_count=DBTopic.comment_count + 1)
+    )
     db.commit()
     db.refresh(db_comment)
     return db_comment
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+# an older discussion_board.db has no topics.comment_count: add it and count
+# the comments already there, once
+if "comment_count" not in {c["name"] for c in inspect(engine).get_columns("topics")}:
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE topics ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text(
+            "UPDATE topics SET comment_count = "
+            "(SELECT COUNT(*) FROM comments WHERE comments.topic_id = topics.id)"
+        ))
+# create_all skips tables that already exist, so add any indexes that are
+# missing from an older discussion_board.db
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
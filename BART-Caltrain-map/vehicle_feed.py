@@ -0,0 +1,263 @@
+# vehicle_feed.py — 511.org SIRI VehicleMonitoring client shared by every Bokeh session
+#
+# `bokeh serve bart.py` runs bart.py again for each browser tab, but imported
+# modules are loaded once per process, so the poller here is a process-wide
+# singleton: it calls the API once per interval no matter how many tabs are
+# open, caches the parsed vehicles and fans each snapshot out to every
+# session. Requests go through a token bucket sized to the API key's hourly
+# limit, and polling backs off when 511 says the limit is exceeded.
+
+import os, time, json, threading
+from functools import lru_cache
+import requests
+
+API_KEY = os.getenv("BART_511_API_KEY") or os.getenv("FIVE11_API_KEY") or os.getenv("API_511_KEY")
+
+BASE = "http://api.511.org/transit"
+POLL_SECONDS = 60
+REQUESTS_PER_HOUR = int(os.getenv("FIVE11_REQUESTS_PER_HOUR", "60"))  # 511's default per API key
+MAX_BACKOFF_SECONDS = 15 * 60
+
+HEADERS = {"Accept": "application/json"}
+
+class RateLimited(Exception):
+    """511 answered that the API key's request limit is exceeded."""
+
+def check_rate_limit(r):
+    # 511 reports the limit in the body, sometimes with an error status
+    if "exceeded" in r.text.lower():
+        print(f"Rate limit exceeded: {r.text}")
+        raise RateLimited(r.text.strip())
+
+@lru_cache(maxsize=1)
+def get_operator_ids():
+    """Return {'BART': 'BA', 'Caltrain': '<id>'} by querying 511 Operators API once."""
+    r = requests.get(f"{BASE}/operators", params={"api_key": API_KEY, "format": "json"}, headers=HEADERS, timeout=15)
+    check_rate_limit(r)
+    r.raise_for_status()
+    ops = safe_json(r)
+    # Response can be list or dict with 'content'; normalize to list of dicts with Id/Name keys.
+    if isinstance(ops, dict) and "content" in ops:
+        entries = ops["content"]
+    else:
+        entries = ops
+    
+    # Debug: print all operators to see what we get
+    print("Available operators:")
+    for op in entries:
+        print(f"  ID: {op.get('Id')}, Name: {op.get('Name')}")
+    
+    # Look specifically for BART by exact name matches only
+    bart = None
+    for op in entries:
+        name = op.get("Name", "")
+        # Look for exact BART matches, not partial
+        if name == "Bay Area Rapid Transit":
+            bart = op["Id"]
+            print(f"Found exact BART match: {op}")
+            break
+    
+    # Force use of BA if no exact match (we know from output that BA = Bay Area Rapid Transit)
+    if not bart:
+        bart = "BA"
+        print(f"Using fallback BART operator ID: BA")
+    
+    caltrain = next((o["Id"] for o in entries if "caltrain" in o.get("Name","").lower()), None)
+    
+    print(f"Final selected operators - BART: {bart}, Caltrain: {caltrain}")
+    return {"BART": bart, "Caltrain": caltrain}
+
+def fetch_vehicle_monitoring(operator_id):
+    """
+    Call SIRI VehicleMonitoring JSON; return list of dicts with lon/lat/line/veh/ts/bearing.
+    Raises RateLimited, or the requests error, when there is no data.
+    """
+    if not operator_id:
+        return []
+    print(f"Fetching vehicles for operator: {operator_id}")
+    try:
+        r = requests.get(f"{BASE}/VehicleMonitoring", params={"api_key": API_KEY, "agency": operator_id, "format": "json"}, headers=HEADERS, timeout=20)
+        check_rate_limit(r)
+        r.raise_for_status()
+        data = safe_json(r)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data for operator {operator_id}: {e}")
+        raise
+    # Navigate SIRI JSON safely
+    sd = data.get("Siri", {}).get("ServiceDelivery", {})
+    vmd = sd.get("VehicleMonitoringDelivery") or []
+    if isinstance(vmd, dict):
+        vmd = [vmd]
+    out = []
+    for delivery in vmd:
+        for act in delivery.get("VehicleActivity", []) or []:
+            mvj = act.get("MonitoredVehicleJourney", {})
+            loc = mvj.get("VehicleLocation") or {}
+            try:
+                lat = float(loc.get("Latitude"))
+                lon = float(loc.get("Longitude"))
+            except (TypeError, ValueError):
+                continue
+            
+            # Filter to Bay Area bounds: lat [36.8, 38.7], lon [-123.1, -121.2]
+            if not (36.8 <= lat <= 38.7 and -123.1 <= lon <= -121.2):
+                continue
+            
+            vehicle_data = {
+                "lat": lat,
+                "lon": lon,
+                "line": str(mvj.get("LineRef") or ""),
+                "vehicle": str(mvj.get("VehicleRef") or ""),
+                "bearing": mvj.get("Bearing"),
+                "updated": act.get("RecordedAtTime") or sd.get("ResponseTimestamp"),
+            }
+            
+            # Debug: print a few sample coordinates to see if they look reasonable
+            if len(out) < 3:  # Only print first few to avoid spam
+                print(f"  Vehicle {vehicle_data['vehicle']} at lat={lat:.4f}, lon={lon:.4f}, line={vehicle_data['line']}")
+            
+            out.append(vehicle_data)
+    
+    print(f"Found {len(out)} vehicles for operator {operator_id}")
+    return out
+
+def safe_json(r):
+    try:
+        return r.json()
+    except json.JSONDecodeError:
+        return json.loads(r.content.decode("utf-8-sig"))
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if there is one; returns 0, or the seconds until there will be one."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, stop=None):
+        """Wait for a token; returns False if `stop` (a threading.Event) was set first."""
+        stop = stop or threading.Event()
+        while (wait := self.try_acquire()) > 0:
+            if stop.wait(wait):
+                return False
+        return True
+
+    def drain(self):
+        """The server says we're over the limit: spend what we thought we had left."""
+        with self._lock:
+            self._refill()
+            self.tokens = 0
+
+
+class VehicleFeed:
+    """
+    Polls 511 for BART and Caltrain vehicles and hands each snapshot
+    (dict with bart, caltrain, updated and error) to every subscriber.
+    """
+
+    def __init__(self, interval=POLL_SECONDS, bucket=None, fetch=fetch_vehicle_monitoring):
+        self.interval = interval
+        self.bucket = bucket or TokenBucket(capacity=10, rate=REQUESTS_PER_HOUR / 3600)
+        self.fetch = fetch
+        self.operators = None
+        self.snapshot = None
+        self.backoff = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` for every new snapshot, starting with the cached one."""
+        with self._lock:
+            self._subscribers.append(callback)
+            snapshot = self.snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="vehicle-feed", daemon=True)
+                self._thread.start()
+        if snapshot is not None:
+            callback(snapshot)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _request(self, fetch, *args):
+        if not self.bucket.acquire(self._stop):
+            raise RuntimeError("vehicle feed stopped")
+        return fetch(*args)
+
+    def poll_once(self):
+        """Fetch both agencies (one rate-limited request each) and publish the result."""
+        if self.operators is None:
+            self.operators = self._request(get_operator_ids)
+        bart = self._request(self.fetch, self.operators.get("BART"))
+        cal = self._request(self.fetch, self.operators.get("Caltrain")) if self.operators.get("Caltrain") else []
+        self._publish(dict(bart=bart, caltrain=cal, updated=time.time(), error=None))
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                self.backoff = 0
+            except RateLimited:
+                # the server's count is what matters: stop spending tokens and slow down
+                self.bucket.drain()
+                self.backoff = min(max(2 * self.backoff, self.interval), MAX_BACKOFF_SECONDS)
+                self._publish_error(f"511 rate limit exceeded, retrying in {self.interval + self.backoff:.0f}s")
+            except Exception as e:
+                print(f"Vehicle feed error: {e}")
+                # request errors include the URL, and with it the API key: keep details in the log
+                self._publish_error(f"{type(e).__name__}, retrying in {self.interval:.0f}s")
+            self._stop.wait(self.interval + self.backoff)
+
+    def _publish_error(self, message):
+        # sessions keep showing the last vehicles we had
+        last = self.snapshot or dict(bart=[], caltrain=[], updated=None)
+        self._publish(dict(last, error=message))
+
+    def _publish(self, snapshot):
+        with self._lock:
+            self.snapshot = snapshot
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Dropping vehicle feed subscriber: {e}")
+                self.unsubscribe(callback)
+
+    def stop(self):
+        self._stop.set()
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_feed():
+    """The process-wide VehicleFeed, created on first use."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = VehicleFeed()
+        return _feed
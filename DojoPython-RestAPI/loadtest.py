@@ -0,0 +1,203 @@
+"""
+Load generator for the discussion board API.
+
+Seeds the database with users, topics and comments, then drives the API
+with concurrent clients and reports req/s and p50/p95/p99 latency per
+route, plus the server-side timings and SQL query counts from /metrics.
+
+By default the app runs in-process through its ASGI interface (no server
+needed). Pass --url to load test a running server instead, e.g.:
+
+    uvicorn main:app --workers 1 &
+    python loadtest.py --url http://127.0.0.1:8000 --skip-seed
+
+Set DATABASE_URL (see main.py) to load test against a scratch database
+instead of discussion_board.db.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import func, insert, select
+
+# main.py serves static/ and templates/ relative to the working directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+
+PASSWORD = "loadtest-password"
+
+
+async def seed(num_users: int, num_topics: int, num_comments: int) -> None:
+    """Bulk insert users, topics and comments straight into the database."""
+    async with main.engine.begin() as conn:
+        await conn.run_sync(main.create_tables)
+
+    # bcrypt is slow on purpose, so every seeded user shares one hash
+    hashed = main.get_password_hash(PASSWORD)
+    run_id = uuid.uuid4().hex[:8]
+    now = datetime.utcnow()
+    users = [
+        {
+            "id": str(uuid.uuid4()),
+            "username": f"load{run_id}_{i}",
+            "email": f"load{run_id}_{i}@example.com",
+            "hashed_password": hashed,
+            "created_at": now,
+        }
+        for i in range(num_users)
+    ]
+    topics = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Load test topic {i}",
+            "description": "Seeded by loadtest.py",
+            "created_by_id": random.choice(users)["id"],
+            "created_at": now - timedelta(seconds=num_topics - i),
+        }
+        for i in range(num_topics)
+    ]
+    async with main.SessionLocal() as db:
+        await db.execute(insert(main.DBUser), users)
+        await db.execute(insert(main.DBTopic), topics)
+        for start in range(0, num_comments, main.BULK_BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + main.BULK_BATCH_SIZE, num_comments)):
+                created_at = now - timedelta(seconds=num_comments - i)
+                batch.append({
+                    "id": str(uuid.uuid4()),
+                    "content": f"Load test comment {i}",
+                    # skewed so some topics are much busier than others
+                    "topic_id": topics[int(random.paretovariate(1.2)) % num_topics]["id"],
+                    "created_by_id": random.choice(users)["id"],
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                })
+            await db.execute(insert(main.DBComment), batch)
+        await db.commit()
+
+    # Core inserts bypass the routes that keep topics.comment_count current
+    async with main.engine.begin() as conn:
+        await conn.run_sync(main.count_topic_comments)
+        counted = await conn.scalar(select(func.coalesce(func.sum(main.DBTopic.comment_count), 0)))
+        comments = await conn.scalar(select(func.count()).select_from(main.DBComment))
+    assert counted == comments, f"comment_count totals {counted}, comments table has {comments}"
+    print(f"Seeded {num_users} users, {num_topics} topics, {num_comments} comments")
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+async def run_load(client: httpx.AsyncClient, num_requests: int, concurrency: int,
+                   write_ratio: float) -> None:
+    # log in once; every worker shares the token like a busy real user would
+    async with main.SessionLocal() as db:
+        user = await db.scalar(
+            select(main.DBUser).where(main.DBUser.email.like("load%@example.com"))
+        )
+        topic_ids = list((await db.scalars(
+            select(main.DBTopic.id).order_by(main.DBTopic.created_at.desc()).limit(1000)
+        )).all())
+    if user is None or not topic_ids:
+        raise SystemExit("No seeded data found; run without --skip-seed first")
+    login = await client.post("/auth/login", data={"username": user.email, "password": PASSWORD})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    async def list_topics_deep():
+        first = await client.get("/topics", params={"limit": 20, "include_total": "false"})
+        cursor = first.json().get("next_cursor")
+        if cursor:
+            return await client.get("/topics", params={"limit": 20, "cursor": cursor})
+        return first
+
+    reads = [
+        ("GET /topics", lambda: client.get("/topics")),
+        ("GET /topics?sort=most_active", lambda: client.get("/topics", params={"sort": "most_active"})),
+        ("GET /topics?cursor", list_topics_deep),
+        ("GET /topics/{topic_id}", lambda: client.get(f"/topics/{random.choice(topic_ids)}")),
+        ("GET /topics/{topic_id}/comments",
+         lambda: client.get(f"/topics/{random.choice(topic_ids)}/comments")),
+    ]
+    writes = [
+        ("POST /topics/{topic_id}/comments",
+         lambda: client.post(f"/topics/{random.choice(topic_ids)}/comments",
+                             json={"content": "load test"}, headers=headers)),
+        ("POST /topics",
+         lambda: client.post("/topics", json={"title": "load", "description": "test"},
+                             headers=headers)),
+    ]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    remaining = num_requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name, call = random.choice(writes if random.random() < write_ratio else reads)
+            t0 = time.perf_counter()
+            response = await call()
+            latencies[name].append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    await client.delete("/metrics", headers=headers)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{num_requests} requests, concurrency {concurrency}: "
+          f"{elapsed:.2f}s, {num_requests / elapsed:,.1f} req/s")
+    print(f"{'route':40} {'count':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name, values in sorted(latencies.items()):
+        ordered = sorted(values)
+        print(f"{name:40} {len(values):6} {len(values) / elapsed:8.1f} "
+              f"{percentile(ordered, 0.50) * 1000:8.2f} {percentile(ordered, 0.95) * 1000:8.2f} "
+              f"{percentile(ordered, 0.99) * 1000:8.2f} {errors[name]:6}")
+
+    print("\nServer-side /metrics:")
+    print(f"{'route':40} {'count':>6} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for route, m in (await client.get("/metrics", headers=headers)).json().items():
+        print(f"{route:40} {m['count']:6} {m['p50_ms']:8.2f} {m['p99_ms']:8.2f} "
+              f"{m['queries_per_request']:8.2f}")
+
+
+async def amain(args: argparse.Namespace) -> None:
+    if not args.skip_seed:
+        await seed(args.users, args.topics, args.comments)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest")
+    async with client:
+        await run_load(client, args.requests, args.concurrency, args.write_ratio)
+    await main.engine.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the discussion board API")
+    parser.add_argument("--users", type=int, default=100, help="users to seed (default: 100)")
+    parser.add_argument("--topics", type=int, default=1000, help="topics to seed (default: 1000)")
+    parser.add_argument("--comments", type=int, default=50000, help="comments to seed (default: 50000)")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse previously seeded data")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (default: 2000)")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients (default: 20)")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="fraction of writes (default: 0.1)")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process ASGI)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(amain(parse_args()))
@@ -0,0 +1,277 @@
+"""
+Throughput benchmark for the two chat apps (chat_sse and chat_websockets).
+
+Starts N simulated clients with asyncio. Every client listens, and between
+them they send messages at a fixed total rate. Each message carries a
+sequence number, so every delivery to every client gives one end-to-end
+latency sample (send -> broadcast -> received). Reported:
+  - delivery latency p50/p95/p99/max and lost deliveries
+  - messages/s sent and deliveries/s received
+  - server RSS and thread count, sampled while the test runs
+
+Against an app you started yourself (pass its pid for the memory/thread
+numbers):
+
+    python chat_benchmark.py sse --url http://localhost:8080 --pid 12345
+
+Or let the benchmark start the app on a free port and stop it afterwards:
+
+    python chat_benchmark.py sse --launch --clients 100 --rate 50
+    python chat_benchmark.py websocket --launch --clients 100 --rate 50
+
+Needs httpx, psutil and python-socketio with its asyncio client (aiohttp),
+on top of the apps' own requirements:
+
+    pip install -r requirements-benchmark.txt
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+import socketio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MESSAGE_RE = re.compile(r'bench-(\d+|warmup)')
+
+# how --launch starts each app: threaded, no debug reloader (so the pid we
+# get is the server itself)
+LAUNCH = {
+    'sse': ('chat_sse', 'import app; app.app.run(port={port}, threaded=True)'),
+    'websocket': ('chat_websockets',
+                  'import app; app.socketio.run(app.app, port={port}, allow_unsafe_werkzeug=True)'),
+}
+
+
+class Results:
+    def __init__(self):
+        self.sent = {}  # sequence number -> send time
+        self.latencies = []
+        self.warmed_up = 0
+        self.send_errors = 0
+
+    def received(self, text):
+        match = MESSAGE_RE.search(text)
+        if not match:
+            return
+        if match.group(1) == 'warmup':
+            self.warmed_up += 1
+            return
+        sent = self.sent.get(int(match.group(1)))
+        if sent is not None:
+            self.latencies.append(time.perf_counter() - sent)
+
+
+class SSEClient:
+    """A browser on chat_sse: a cookie, the /messages stream and form posts."""
+
+    def __init__(self, url, results):
+        self.http = httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(30, read=None))
+        self.results = results
+        self.listener = None
+
+    async def connect(self):
+        await self.http.get('/')  # sets the client_id cookie
+        self.listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        async with self.http.stream('GET', '/messages') as response:
+            async for line in response.aiter_lines():
+                if line.startswith('data: '):
+                    self.results.received(line)
+
+    async def send(self, text):
+        response = await self.http.post('/send_message', data={'message': text})
+        response.raise_for_status()
+
+    async def close(self):
+        if self.listener:
+            self.listener.cancel()
+        await self.http.aclose()
+
+
+class WebSocketClient:
+    """A browser on chat_websockets: the page's user_id and a Socket.IO socket."""
+
+    def __init__(self, url, results):
+        self.url = url
+        self.results = results
+        self.sio = socketio.AsyncClient()
+        self.sio.on('receive_message', lambda data: results.received(data['message']))
+        self.user_id = None
+
+    async def connect(self):
+        async with httpx.AsyncClient(base_url=self.url) as http:
+            page = await http.get('/')
+        self.user_id = re.search(r'const user_id = "([^"]*)"', page.text).group(1)
+        await self.sio.connect(self.url, auth={'user_id': self.user_id}, transports=['websocket'])
+
+    async def send(self, text):
+        await self.sio.emit('send_message', {'user_id': self.user_id, 'message': text})
+
+    async def close(self):
+        await self.sio.disconnect()
+
+
+CLIENTS = {'sse': SSEClient, 'websocket': WebSocketClient}
+
+
+class ServerSampler:
+    """Samples RSS and thread count of the server process in the background."""
+
+    def __init__(self, pid, interval=0.5):
+        self.process = psutil.Process(pid) if pid else None
+        self.interval = interval
+        self.samples = []  # (rss bytes, threads)
+
+    def sample(self):
+        if self.process:
+            with self.process.oneshot():
+                self.samples.append((self.process.memory_info().rss, self.process.num_threads()))
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while True:
+            try:
+                await http.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"{url} did not come up in {timeout}s")
+                await asyncio.sleep(0.2)
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return condition()
+
+
+async def run_benchmark(args, url, pid):
+    results = Results()
+    sampler = ServerSampler(pid)
+    sampler.sample()
+    baseline = sampler.samples[-1] if sampler.samples else None
+
+    client_class = CLIENTS[args.app]
+    clients = [client_class(url, results) for _ in range(args.clients)]
+    t0 = time.perf_counter()
+    for start in range(0, len(clients), args.connect_batch):
+        await asyncio.gather(*(c.connect() for c in clients[start:start + args.connect_batch]))
+    print(f"Connected {len(clients)} {args.app} clients in {time.perf_counter() - t0:.2f}s")
+
+    # Streams may only be fully open once the first event arrives, so wait
+    # until everyone has seen a warmup message before measuring.
+    await clients[0].send('bench-warmup')
+    if not await wait_for(lambda: results.warmed_up >= len(clients), 30):
+        print(f"Only {results.warmed_up}/{len(clients)} clients got the warmup message")
+
+    sampling = asyncio.create_task(sampler.run())
+    senders = clients[:args.senders] if args.senders else clients
+    total = int(args.rate * args.duration)
+    in_flight = set()
+
+    async def send(client, seq):
+        try:
+            await client.send(f'bench-{seq}')
+        except Exception:
+            results.send_errors += 1
+
+    start = time.perf_counter()
+    for seq in range(total):
+        delay = start + seq / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        results.sent[seq] = time.perf_counter()
+        task = asyncio.create_task(send(senders[seq % len(senders)], seq))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    send_elapsed = time.perf_counter() - start
+
+    expected = total * len(clients)
+    await wait_for(lambda: len(results.latencies) >= expected, args.drain)
+    elapsed = time.perf_counter() - start
+    sampling.cancel()
+    sampler.sample()
+    for client in clients:
+        await client.close()
+
+    received = len(results.latencies)
+    print(f"\n{args.app}: {len(clients)} clients, {len(senders)} senders, "
+          f"{total} messages over {send_elapsed:.2f}s")
+    print(f"  sent          {total / send_elapsed:10.1f} msg/s  ({results.send_errors} send errors)")
+    print(f"  delivered     {received / elapsed:10.1f} msg/s  "
+          f"({received}/{expected}, {expected - received} lost or late)")
+    if received:
+        ordered = sorted(results.latencies)
+        print(f"  latency ms    p50 {percentile(ordered, 0.50) * 1000:.1f}  "
+              f"p95 {percentile(ordered, 0.95) * 1000:.1f}  "
+              f"p99 {percentile(ordered, 0.99) * 1000:.1f}  max {ordered[-1] * 1000:.1f}")
+    if baseline:
+        peak_rss = max(rss for rss, _ in sampler.samples)
+        peak_threads = max(threads for _, threads in sampler.samples)
+        print(f"  server RSS    {baseline[0] / 2**20:.1f} MiB idle, {peak_rss / 2**20:.1f} MiB peak")
+        print(f"  server threads {baseline[1]} idle, {peak_threads} peak")
+
+
+async def amain(args):
+    process = None
+    url, pid = args.url, args.pid
+    if args.launch:
+        directory, code = LAUNCH[args.app]
+        port = free_port()
+        process = subprocess.Popen([sys.executable, '-c', code.format(port=port)],
+                                   cwd=os.path.join(HERE, directory),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url, pid = f'http://127.0.0.1:{port}', process.pid
+    try:
+        await wait_until_up(url)
+        await run_benchmark(args, url, pid)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the HTMX chat apps")
+    parser.add_argument("app", choices=sorted(CLIENTS), help="which chat app is being tested")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="running app (default: %(default)s)")
+    parser.add_argument("--pid", type=int, help="server pid, for memory and thread counts")
+    parser.add_argument("--launch", action="store_true", help="start the app on a free port instead of --url")
+    parser.add_argument("--clients", type=int, default=50, help="simulated clients (default: 50)")
+    parser.add_argument("--senders", type=int, default=0, help="clients that send (default: all)")
+    parser.add_argument("--rate", type=float, default=20, help="messages/s sent in total (default: 20)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of sending (default: 10)")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to wait for late deliveries (default: 10)")
+    parser.add_argument("--connect-batch", type=int, default=50, help="clients connecting at once (default: 50)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(amain(parse_args()))
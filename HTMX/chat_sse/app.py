@@ -1,16 +1,166 @@
 from flask import Flask, render_template, request, Response, redirect, url_for, make_response
 from faker import Faker
+from collections import deque
+from itertools import count, islice
+import json
+import os
+import threading
 import uuid
-import time
 import logging
 
 app = Flask(__name__)
 faker = Faker()
 logging.basicConfig(level=logging.DEBUG)
 
+KEEPALIVE_SECONDS = 15  # idle listeners get an SSE comment this often
+HISTORY_SIZE = 1000  # events kept in memory per broker
+REPLAY_BATCH = 1000  # most events read from the log per since() call
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_history.log')
+
+
+class Broker:
+    """
+    Publish/subscribe channel. Subscribers block on a condition variable and
+    are woken the moment something is published, instead of sleep-polling.
+
+    Every event gets a monotonically increasing id (sent as the SSE "id:"
+    field). Only the last history_size events are kept in memory; if a
+    log_path is given every event is also appended there, so a client that
+    reconnects with an older Last-Event-ID is replayed from disk, at most
+    REPLAY_BATCH events at a time.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, log_path=None):
+        self._cond = threading.Condition()
+        self._history = deque(maxlen=history_size)  # (event_id, event)
+        self._log_path = log_path
+        self._log = None
+        self.last_id = 0
+        if log_path:
+            self.last_id = self._last_logged_id()
+            self._log = open(log_path, 'a', buffering=1)  # line buffered
+
+    def _last_logged_id(self):
+        """Continue numbering after the last event already in the log."""
+        if not os.path.exists(self._log_path):
+            return 0
+        with open(self._log_path, 'rb') as f:
+            # read backwards until the whole last line is in hand
+            position = f.seek(0, os.SEEK_END)
+            tail = b''
+            while position > 0 and b'\n' not in tail.rstrip(b'\n'):
+                step = min(64 * 1024, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step) + tail
+        lines = tail.rstrip(b'\n').rsplit(b'\n', 1)
+        return int(lines[-1].split(b'\t', 1)[0]) if lines[-1] else 0
+
+    def publish(self, event):
+        with self._cond:
+            self.last_id += 1
+            self._history.append((self.last_id, event))
+            if self._log:
+                self._log.write(f"{self.last_id}\t{json.dumps(event)}\n")
+            self._cond.notify_all()
+
+    def recent(self, count):
+        """The last count (event_id, event) pairs."""
+        with self._cond:
+            return list(islice(reversed(self._history), count))[::-1]
+
+    def since(self, last_id):
+        """
+        The (event_id, event) pairs published after last_id. Events that are
+        only in the log come back REPLAY_BATCH at a time, oldest first; call
+        again with the last id returned for the rest.
+        """
+        with self._cond:
+            new_count = self.last_id - last_id
+            if new_count <= 0:
+                return []
+            # walk from the newest end: O(new events), not O(history)
+            recent = list(islice(reversed(self._history), new_count))[::-1]
+        if len(recent) < new_count and self._log_path:
+            first_in_memory = recent[0][0] if recent else self.last_id + 1
+            logged = self._read_log(last_id, first_in_memory, REPLAY_BATCH)
+            if len(logged) == REPLAY_BATCH:
+                return logged  # more in the log before the in-memory events
+            return logged + recent
+        return recent
+
+    def _read_log(self, after_id, before_id, limit):
+        events = []
+        with open(self._log_path, 'rb') as f:
+            f.seek(self._log_offset(f, after_id))
+            for line in f:
+                event_id, data = line.rstrip(b'\n').split(b'\t', 1)
+                event_id = int(event_id)
+                if event_id >= before_id:
+                    break
+                if event_id > after_id:
+                    events.append((event_id, json.loads(data)))
+                    if len(events) == limit:
+                        break
+        return events
+
+    @staticmethod
+    def _log_offset(f, after_id):
+        """
+        Start of a line at or before the first event after after_id. Ids in
+        the log only go up, so this is a binary search over byte offsets
+        instead of a scan of the whole file.
+        """
+        low, high = 0, f.seek(0, os.SEEK_END)  # low is always the start of a line
+        while high - low > 4096:
+            middle = (low + high) // 2
+            f.seek(middle)
+            f.readline()  # skip to the next line start
+            line_start = f.tell()
+            line = f.readline()
+            if line_start >= high or not line.endswith(b'\n'):
+                high = middle
+            elif int(line.split(b'\t', 1)[0]) <= after_id:
+                low = line_start
+            else:
+                high = middle
+        return low
+
+    def wait_for_new(self, last_id, timeout):
+        """Return the events after last_id, waiting up to timeout for one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id > last_id, timeout)
+        return self.since(last_id)
+
+
+def resume_id(broker):
+    """Where a stream starts: the browser's Last-Event-ID on reconnect, else the
+    id of the last message the page was rendered with, else now."""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        # ids from before a restart can be ahead of a broker that counts from 1 again
+        return min(int(last_id), broker.last_id)
+    except (TypeError, ValueError):
+        return broker.last_id
+
+
+def sse_stream(broker, last_id, encode=str):
+    while True:
+        events = broker.wait_for_new(last_id, KEEPALIVE_SECONDS)
+        if not events:
+            # a comment line; also lets us notice clients that went away
+            yield ": keepalive\n\n"
+            continue
+        last_id = events[-1][0]
+        yield "".join(f"id: {event_id}\ndata: {encode(event)}\n\n" for event_id, event in events)
+
+
 # In-memory storage for simplicity
 clients = {}
-messages = []
+message_broker = Broker(log_path=HISTORY_FILE)
+# user list changes are published as {"id": ..., "name": ...} upserts
+user_broker = Broker()
+user_ids = count(1)  # public ids for the user list (client_id stays secret)
 
 
 @app.route('/')
@@ -20,25 +170,36 @@ def index():
         # Assign new client_id and screen_name
         client_id = str(uuid.uuid4())
         screen_name = faker.first_name()
-        clients[client_id] = {'screen_name': screen_name}
-        current_users = [client['screen_name'] for client in clients.values()]
-        recent_messages = messages[-10:]
+        clients[client_id] = {'screen_name': screen_name, 'user_id': next(user_ids)}
+        user_broker.publish({'id': clients[client_id]['user_id'], 'name': screen_name})
+        # read the ids first: an event racing in is sent twice, never lost
+        last_user_event_id = user_broker.last_id
+        last_message_id = message_broker.last_id
+        current_users = list(clients.values())
+        recent_messages = message_broker.recent(10)
         # Create response and set cookie
         response = make_response(
             render_template('index.html',
                             screen_name=screen_name,
                             current_users=current_users,
-                            recent_messages=recent_messages))
+                            recent_messages=recent_messages,
+                            last_message_id=last_message_id,
+                            last_user_event_id=last_user_event_id))
         response.set_cookie('client_id', client_id)  # Set the client_id cookie
         return response
     else:
         screen_name = clients[client_id]['screen_name']
-        current_users = [client['screen_name'] for client in clients.values()]
-        recent_messages = messages[-10:]
+        # read the ids first: an event racing in is sent twice, never lost
+        last_user_event_id = user_broker.last_id
+        last_message_id = message_broker.last_id
+        current_users = list(clients.values())
+        recent_messages = message_broker.recent(10)
         return render_template('index.html',
                                screen_name=screen_name,
                                current_users=current_users,
-                               recent_messages=recent_messages)
+                               recent_messages=recent_messages,
+                               last_message_id=last_message_id,
+                               last_user_event_id=last_user_event_id)
 
 
 @app.route('/send_message', methods=['POST'])
@@ -48,50 +209,22 @@ def send_message():
         return '', 403
     screen_name = clients[client_id]['screen_name']
     message = request.form['message']
-    messages.append(f"{screen_name}: {message}")
+    message_broker.publish(f"{screen_name}: {message}")
     app.logger.debug(f"/send_message: {screen_name}:{message}")
     return '', 204
 
 
 @app.route('/messages')
 def events():
-
-    def event_stream():
-        last_index = len(messages)
-        interval = 0.1  # Start with a short interval (100ms)
-        max_interval = 5  # Maximum interval (5 seconds)
-        while True:
-            if len(messages) > last_index:
-                yield f"data: {messages[last_index]}\n\n"
-                last_index += 1
-                interval = 0.1  # Reset to the shortest interval when new messages arrive
-            else:
-                time.sleep(interval)  # delay to reduce CPU load
-                if interval < max_interval:
-                    interval = min(
-                        interval * 2,
-                        max_interval)  # Increase the interval gradually
-
-    return Response(event_stream(), mimetype='text/event-stream')
+    last_id = resume_id(message_broker)
+    return Response(sse_stream(message_broker, last_id), mimetype='text/event-stream')
 
 
 @app.route('/user_events')
 def user_events():
-
-    def user_event_stream():
-        known_clients = set(clients.keys())
-        known_screen_names = [clients[c]['screen_name'] for c in clients]
-        while True:
-            current_clients = set(clients.keys())
-            current_screen_names = [clients[c]['screen_name'] for c in clients]
-            if current_clients != known_clients or current_screen_names != known_screen_names:
-                # If there is any change in clients or screen names, update the list
-                yield f"data: {','.join(current_screen_names)}\n\n"
-                known_clients = current_clients
-                known_screen_names = current_screen_names
-            time.sleep(5)  # Check for updates every 5 seconds
-
-    return Response(user_event_stream(), mimetype='text/event-stream')
+    # only changes are sent; the page renders the initial list
+    last_id = resume_id(user_broker)
+    return Response(sse_stream(user_broker, last_id, json.dumps), mimetype='text/event-stream')
 
 
 @app.route('/change_screen_name', methods=['POST'])
@@ -105,10 +238,11 @@ def change_screen_name():
     if new_name:
         clients[client_id]['screen_name'] = new_name
         app.logger.debug(f"Screen name changed from {old_name} to {new_name}")
+        user_broker.publish({'id': clients[client_id]['user_id'], 'name': new_name})
 
         # Send a message notifying users of the screen name change
         change_message = f"User '{old_name}' changed their name to '{new_name}'"
-        messages.append(change_message)
+        message_broker.publish(change_message)
 
     return '', 204
 
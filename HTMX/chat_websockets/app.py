@@ -1,55 +1,86 @@
+import os
+
 from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import faker
 import time
 
+import chat_hub
+
+# Unset: a single process. hub:///path/to.sock: any number of workers sharing
+# broadcasts and presence through chat_hub.py. Other URLs (redis://, amqp://)
+# go to Flask-SocketIO's own queues, which share broadcasts but not presence.
+MESSAGE_QUEUE = os.environ.get('CHAT_MESSAGE_QUEUE')
+USER_LIST_DEBOUNCE_SECONDS = 0.5  # joins/leaves within this window share one update
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
-socketio = SocketIO(app, cors_allowed_origins="*")  # Allow all origins
+if MESSAGE_QUEUE and MESSAGE_QUEUE.startswith('hub://'):
+    presence = chat_hub.connect(MESSAGE_QUEUE)
+    # The hub proxy blocks, so use real threads rather than eventlet
+    socketio = SocketIO(app, cors_allowed_origins="*",  # Allow all origins
+                        async_mode='threading',
+                        client_manager=chat_hub.HubClientManager(MESSAGE_QUEUE))
+else:
+    presence = chat_hub.Presence()
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=MESSAGE_QUEUE)
 
-# In-memory storage for messages and users
-messages = []
-users = {}
+socket_users = {}  # request.sid -> user_id for this worker's sockets
 
 
 def generate_random_name():
     return faker.Faker().name()
 
 
+def schedule_user_list_update():
+    """
+    Send the user list once per debounce window instead of once per change.
+    The window is kept by presence (the hub), so however many workers see
+    changes, only one of them sends the update.
+    """
+    if presence.claim_user_list_update(USER_LIST_DEBOUNCE_SECONDS):
+        socketio.start_background_task(send_user_list)
+
+
+def send_user_list():
+    socketio.sleep(USER_LIST_DEBOUNCE_SECONDS)
+    socketio.emit('update_user_list', presence.online_users())
+
+
 @app.route('/')
 def index():
     user_id = request.cookies.get('user_id')
-    if not user_id or user_id not in users:
+    if not user_id or not presence.user_name(user_id):
         user_id = generate_random_name()
-        users[user_id] = {'name': user_id}
+        presence.add_user(user_id, user_id)
     return render_template('index.html',
                            user_id=user_id,
-                           user_name=users[user_id]['name'],
-                           users=users)
+                           user_name=presence.user_name(user_id),
+                           users=presence.online_users())
 
 
 @socketio.on('connect')
-def handle_connect():
-    user_id = request.cookies.get('user_id')
-    if user_id and user_id not in users:
-        users[user_id] = {'name': user_id}
-    emit('update_user_list', list(users.values()), broadcast=True)
+def handle_connect(auth=None):
+    user_id = (auth or {}).get('user_id') or request.cookies.get('user_id')
+    if not user_id:
+        return
+    socket_users[request.sid] = user_id
+    if presence.user_connected(user_id):
+        schedule_user_list_update()
 
 
 @socketio.on('disconnect')
-def handle_disconnect():
-    user_id = request.cookies.get('user_id')
-    if user_id in users:
-        del users[user_id]
-        emit('update_user_list', list(users.values()), broadcast=True)
+def handle_disconnect(*args):
+    user_id = socket_users.pop(request.sid, None)
+    if user_id and presence.user_disconnected(user_id):
+        schedule_user_list_update()
 
 
 @socketio.on('send_message')
 def handle_send_message(data):
     user_id = data['user_id']
     message = data['message']
-    user_name = users[user_id]['name']
-    messages.append({'user': user_name, 'message': message})
+    user_name = presence.user_name(user_id)
     emit('receive_message', {
         'user': user_name,
         'message': message
@@ -61,15 +92,14 @@ def handle_send_message(data):
 def handle_change_name(data):
     user_id = data['user_id']
     new_name = data['new_name']
-    users[user_id]['name'] = new_name
+    presence.rename_user(user_id, new_name)
     emit('name_changed', {
         'user_id': user_id,
         'new_name': new_name
     },
          broadcast=True)
-    emit('update_user_list', list(users.values()),
-         broadcast=True)  # Update the user list
+    schedule_user_list_update()  # Update the user list
 
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=8080, debug=True)
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)), debug=True)
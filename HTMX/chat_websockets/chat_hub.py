@@ -0,0 +1,223 @@
+"""
+Shared state for running the chat in several worker processes.
+
+A single hub process owns the two things the workers must agree on:
+  - a fan-out message queue: every Socket.IO emit published by one worker is
+    delivered to all workers, which pass it on to their own clients
+  - presence: who is online, counted per socket, so a user with two tabs on
+    two workers stays online until both are closed
+
+Workers talk to the hub with multiprocessing.managers over a UNIX socket, so
+nothing beyond the standard library is needed. Run the hub, then the workers:
+
+    python chat_hub.py /tmp/chat_hub.sock
+    CHAT_MESSAGE_QUEUE=hub:///tmp/chat_hub.sock PORT=8080 python app.py
+    CHAT_MESSAGE_QUEUE=hub:///tmp/chat_hub.sock PORT=8081 python app.py
+"""
+
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+import socketio
+
+AUTHKEY = os.environ.get('CHAT_HUB_AUTHKEY', 'your_hub_key').encode()
+SUBSCRIBER_QUEUE_SIZE = 10000  # a worker this far behind is presumed dead
+LISTEN_TIMEOUT = 5
+SUBSCRIBER_TTL = 3 * LISTEN_TIMEOUT  # a worker silent this long is presumed dead
+OFFLINE_USER_TTL = 3600  # offline users are forgotten after this many seconds
+PRUNE_INTERVAL = 60
+
+
+class Presence:
+    """
+    Known users and how many sockets each has open right now, plus the
+    debounce for user list updates, so it is shared by every worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}  # user_id -> {'name': ..., 'connections': ..., 'seen': ...}
+        self._user_list_due = 0.0  # when the pending user list update is sent
+        self._next_prune = 0.0
+
+    def _user(self, user_id, name):
+        user = self._users.setdefault(user_id, {'name': name, 'connections': 0})
+        user['seen'] = time.monotonic()
+        return user
+
+    def _prune(self):
+        """Forget users who have been offline for OFFLINE_USER_TTL."""
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + PRUNE_INTERVAL
+        for user_id, user in list(self._users.items()):
+            if not user['connections'] and now - user['seen'] > OFFLINE_USER_TTL:
+                del self._users[user_id]
+
+    def add_user(self, user_id, name):
+        with self._lock:
+            self._prune()
+            self._user(user_id, name)
+
+    def user_name(self, user_id):
+        user = self._users.get(user_id)
+        return user['name'] if user else None
+
+    def rename_user(self, user_id, name):
+        with self._lock:
+            self._user(user_id, name)['name'] = name
+
+    def user_connected(self, user_id):
+        """Count a new socket. True if the user just came online."""
+        with self._lock:
+            user = self._user(user_id, user_id)
+            user['connections'] += 1
+            return user['connections'] == 1
+
+    def user_disconnected(self, user_id):
+        """Count a closed socket. True if the user just went offline."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if not user or not user['connections']:
+                return False
+            user['connections'] -= 1
+            user['seen'] = time.monotonic()
+            return user['connections'] == 0
+
+    def online_users(self):
+        with self._lock:
+            return [{'name': u['name']} for u in self._users.values() if u['connections']]
+
+    def claim_user_list_update(self, delay):
+        """
+        True if the caller should send the user list in `delay` seconds;
+        False if an update, from any worker, is already due and will
+        include this change.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._user_list_due > now:
+                return False
+            self._user_list_due = now + delay
+            return True
+
+
+class ChatHub(Presence):
+    """Presence plus a fan-out queue; lives in the hub process."""
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers = {}  # subscriber id -> queue.Queue
+        self._polled = {}  # subscriber id -> when it last called receive
+        self._subscriber_ids = itertools.count(1)
+
+    def subscribe(self):
+        subscriber = next(self._subscriber_ids)
+        self._subscribers[subscriber] = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._polled[subscriber] = time.monotonic()
+        return subscriber
+
+    def _drop(self, subscriber):
+        self._subscribers.pop(subscriber, None)
+        self._polled.pop(subscriber, None)
+
+    def _prune_subscribers(self):
+        """Drop subscribers whose worker has stopped calling receive."""
+        now = time.monotonic()
+        for subscriber, polled in list(self._polled.items()):
+            if now - polled > SUBSCRIBER_TTL:
+                self._drop(subscriber)
+
+    def publish(self, message):
+        self._prune_subscribers()
+        for subscriber, q in list(self._subscribers.items()):
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                self._drop(subscriber)
+
+    def receive(self, subscriber, timeout):
+        """
+        Wait up to timeout for messages and return every one queued, so a
+        busy worker makes one round trip per batch rather than per message.
+        None means the subscription was dropped and must be renewed.
+        """
+        q = self._subscribers.get(subscriber)
+        if q is None:
+            return None
+        self._polled[subscriber] = time.monotonic()
+        try:
+            messages = [q.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        finally:
+            self._polled[subscriber] = time.monotonic()
+        while True:
+            try:
+                messages.append(q.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class HubManager(BaseManager):
+    pass
+
+
+def hub_address(url):
+    """hub:///tmp/chat_hub.sock -> /tmp/chat_hub.sock"""
+    return url[len('hub://'):]
+
+
+def connect(url):
+    """Proxy to the hub at url. Safe to share between threads."""
+    HubManager.register('hub')
+    manager = HubManager(address=hub_address(url), authkey=AUTHKEY)
+    manager.connect()
+    return manager.hub()
+
+
+class HubClientManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager that broadcasts through the hub.
+
+    The hub proxy makes blocking socket calls, so the server must run with
+    async_mode='threading'; under an unpatched eventlet they stall every
+    client of the worker.
+    """
+    name = 'hub'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.hub = connect(url)
+
+    def _publish(self, data):
+        self.hub.publish(data)
+
+    def _listen(self):
+        subscriber = self.hub.subscribe()
+        while True:
+            messages = self.hub.receive(subscriber, LISTEN_TIMEOUT)
+            if messages is None:
+                subscriber = self.hub.subscribe()
+                continue
+            yield from messages
+
+
+def serve(address):
+    hub = ChatHub()
+    HubManager.register('hub', callable=lambda: hub)
+    if os.path.exists(address):
+        os.unlink(address)  # left over from a previous run
+    manager = HubManager(address=address, authkey=AUTHKEY)
+    print(f"Chat hub listening on {address}")
+    manager.get_server().serve_forever()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1] if len(sys.argv) > 1 else '/tmp/chat_hub.sock')
@@ -1,39 +1,69 @@
 # hotdog_or_not.py
 import argparse
+from functools import cache
 from PIL import Image
 import torch
 import torch.nn.functional as F
 from torchvision.models import resnet50, ResNet50_Weights
 
+from image_batches import add_batch_arguments, classify_paths, image_paths, report
+
+
+class HotdogClassifier:
+    # Loads the model once; classify as many images as you like with it
+    def __init__(self, weights: str = "imagenet", quantize: bool = False):
+        # weights: "imagenet" (downloaded once to the torch cache), a path to a
+        # saved state_dict, or "random" (untrained, for offline benchmarking)
+        self.device = "cpu"
+        imagenet = ResNet50_Weights.IMAGENET1K_V2
+        if weights == "imagenet":
+            self.model = resnet50(weights=imagenet)
+        else:
+            self.model = resnet50(weights=None)
+            if weights != "random":
+                self.model.load_state_dict(torch.load(weights, map_location="cpu"))
+        self.model.eval()
+        if quantize:
+            # int8 weights for the Linear layers; in a ResNet that's only the final fc
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        # The transforms and category names come with the weights' metadata
+        self.preprocess = imagenet.transforms()
+        recognized_class_names = imagenet.meta["categories"]
+        self.hotdog_idx = next(i for i, name in enumerate(recognized_class_names) if "hotdog" in name.lower() or "hot dog" in name.lower())
+        # Note: next(generator) is a nice idiom. It returns the first item without calling for the entire list.
+        #       [list comprehension][0] would execute the entire list first
+
+    @torch.inference_mode()
+    def hotdog_probabilities(self, images: torch.Tensor) -> torch.Tensor:
+        # [batch, 3, H, W] preprocessed images -> [batch] p_hotdog
+        logits = self.model(images.to(self.device))
+        return F.softmax(logits, dim=1)[:, self.hotdog_idx]
+
+    def classify(self, image_path: str, threshold: float = 0.5):
+        img = Image.open(image_path).convert("RGB")
+        x = self.preprocess(img).unsqueeze(0)
+        p_hotdog = float(self.hotdog_probabilities(x)[0].item())
+        label = "HOT DOG" if p_hotdog >= threshold else "NOT HOT DOG"
+        return label, p_hotdog
+
+
+@cache
+def default_classifier():
+    return HotdogClassifier()
+
+
 def is_hotdog(image_path: str, threshold: float = 0.5):
-    weights = ResNet50_Weights.IMAGENET1K_V2
-    model = resnet50(weights=weights)
-    model.eval()
-
-    preprocess = weights.transforms()
-    img = Image.open(image_path).convert("RGB")
-    x = preprocess(img).unsqueeze(0)
-
-    with torch.no_grad():
-        logits = model(x)
-        probs = F.softmax(logits, dim=1)[0]
-
-    recognized_class_names = weights.meta["categories"]
-    for name in recognized_class_names:
-        print(name)
-    hotdog_idx = next(i for i, name in enumerate(recognized_class_names) if "hotdog" in name.lower() or "hot dog" in name.lower())
-    # Note: next(generator) is a nice idiom. It returns the first item without calling for the entire list.
-    #       [list comprehension][0] would execute the entire list first
-    p_hotdog = float(probs[hotdog_idx].item())
-    label = "HOT DOG" if p_hotdog >= threshold else "NOT HOT DOG"
-    return label, p_hotdog
+    return default_classifier().classify(image_path, threshold)
+
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("image", help="path to image file")
-    ap.add_argument("--threshold", type=float, default=0.5, help="probability threshold for HOT DOG")
+    add_batch_arguments(ap)
+    ap.add_argument("--weights", default="imagenet",
+                    help='"imagenet" (default), a saved state_dict file, or "random" for offline benchmarking')
     args = ap.parse_args()
 
-    label, p = is_hotdog(args.image, args.threshold)
-    print(f"{label} (p_hotdog={p:.3f})")
-
+    classifier = HotdogClassifier(args.weights, args.quantize)
+    results, stats = classify_paths(classifier, image_paths(args.images), args.batch_size, args.workers, args.threshold)
+    report(results, stats)
@@ -1,5 +1,6 @@
 # hotdog_or_not.py
 import argparse
+from functools import cache
 from PIL import Image
 import torch
 import torch.nn.functional as F
@@ -7,70 +8,92 @@ import torch.nn.functional as F
 # Requires: pip install open_clip_torch
 import open_clip
 
-
-def is_hotdog(image_path: str, threshold: float = 0.5):
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-
-    model, _, preprocess = open_clip.create_model_and_transforms(
-        "ViT-H-14", pretrained="laion2b_s32b_b79k"
-    )
-    model = model.to(device)
-    model.eval()
-
-    img = Image.open(image_path).convert("RGB")
-    x = preprocess(img).unsqueeze(0).to(device)
-
-    # Prompt ensembling for robustness
-    pos_prompts = [
-        "a photo of a hot dog",
-        "a photo of a hotdog",
-        "a photo of a sausage in a bun",
-        "a photo of a frankfurter in a bun",
-    ]
-    neg_prompts = [
-        "a photo of food that is not a hot dog",
-        "a photo of something that is not a hot dog",
-        "a photo without a hot dog",
-    ]
-
-    with torch.no_grad():
-        # Encode image
-        image_features = model.encode_image(x)
-        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-
-        # Encode text prompts
-        pos_tokens = open_clip.tokenize(pos_prompts).to(device)
-        neg_tokens = open_clip.tokenize(neg_prompts).to(device)
-
-        pos_feats = model.encode_text(pos_tokens)
-        neg_feats = model.encode_text(neg_tokens)
-
-        pos_feats = pos_feats / pos_feats.norm(dim=-1, keepdim=True)
-        neg_feats = neg_feats / neg_feats.norm(dim=-1, keepdim=True)
-
-        # Average within each class, then re-normalize
-        pos_feat = pos_feats.mean(dim=0, keepdim=True)
-        neg_feat = neg_feats.mean(dim=0, keepdim=True)
-        pos_feat = pos_feat / pos_feat.norm(dim=-1, keepdim=True)
-        neg_feat = neg_feat / neg_feat.norm(dim=-1, keepdim=True)
-
-        text_feats = torch.cat([pos_feat, neg_feat], dim=0)  # [2, d]
+from image_batches import add_batch_arguments, classify_paths, image_paths, report
+
+# Prompt ensembling for robustness
+POS_PROMPTS = [
+    "a photo of a hot dog",
+    "a photo of a hotdog",
+    "a photo of a sausage in a bun",
+    "a photo of a frankfurter in a bun",
+]
+NEG_PROMPTS = [
+    "a photo of food that is not a hot dog",
+    "a photo of something that is not a hot dog",
+    "a photo without a hot dog",
+]
+
+
+class HotdogClassifier:
+    # Loads the model and encodes the text prompts once; after that every
+    # image only needs encode_image
+    def __init__(self, model_name: str = "ViT-H-14", weights: str = "laion2b_s32b_b79k",
+                 quantize: bool = False):
+        # weights: an open_clip pretrained tag (downloaded once to the cache),
+        # a path to a local checkpoint, or "random" (untrained, for offline benchmarking)
+        self.device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+
+        model, _, self.preprocess = open_clip.create_model_and_transforms(
+            model_name, pretrained=None if weights == "random" else weights
+        )
+        model = model.to(self.device)
+        model.eval()
+        self.model = model
+
+        tokenizer = open_clip.get_tokenizer(model_name)
+        with torch.inference_mode():
+            pos_feats = self._normalize(model.encode_text(tokenizer(POS_PROMPTS).to(self.device)))
+            neg_feats = self._normalize(model.encode_text(tokenizer(NEG_PROMPTS).to(self.device)))
+
+            # Average within each class, then re-normalize
+            pos_feat = self._normalize(pos_feats.mean(dim=0, keepdim=True))
+            neg_feat = self._normalize(neg_feats.mean(dim=0, keepdim=True))
+            self.text_feats = torch.cat([pos_feat, neg_feat], dim=0)  # [2, d]
+
+        if quantize:
+            # int8 weights for the Linear layers of the image tower (most of a ViT's work), CPU only
+            self.model.visual = torch.ao.quantization.quantize_dynamic(
+                self.model.visual, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    @staticmethod
+    def _normalize(features: torch.Tensor) -> torch.Tensor:
+        return features / features.norm(dim=-1, keepdim=True)
+
+    @torch.inference_mode()
+    def hotdog_probabilities(self, images: torch.Tensor) -> torch.Tensor:
+        # [batch, 3, H, W] preprocessed images -> [batch] p_hotdog
+        image_features = self._normalize(self.model.encode_image(images.to(self.device)))
 
         # CLIP similarity -> softmax probability over {hot dog, not hot dog}
-        logits = 100.0 * image_features @ text_feats.T  # temperature scaling as in CLIP
-        probs = F.softmax(logits, dim=-1)[0]
+        logits = 100.0 * image_features @ self.text_feats.T  # temperature scaling as in CLIP
+        return F.softmax(logits, dim=-1)[:, 0].cpu()
+
+    def classify(self, image_path: str, threshold: float = 0.5):
+        img = Image.open(image_path).convert("RGB")
+        x = self.preprocess(img).unsqueeze(0)
+        p_hotdog = float(self.hotdog_probabilities(x)[0].item())
+        label = "HOT DOG" if p_hotdog >= threshold else "NOT HOT DOG"
+        return label, p_hotdog
+
 
-    p_hotdog = float(probs[0].item())
-    label = "HOT DOG" if p_hotdog >= threshold else "NOT HOT DOG"
-    return label, p_hotdog
+@cache
+def default_classifier():
+    return HotdogClassifier()
+
+
+def is_hotdog(image_path: str, threshold: float = 0.5):
+    return default_classifier().classify(image_path, threshold)
 
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("image", help="path to image file")
-    ap.add_argument("--threshold", type=float, default=0.5, help="probability threshold for HOT DOG")
+    add_batch_arguments(ap)
+    ap.add_argument("--model", default="ViT-H-14", help="open_clip model name, e.g. ViT-B-32 for a quicker run")
+    ap.add_argument("--weights", default="laion2b_s32b_b79k",
+                    help='open_clip pretrained tag, a local checkpoint file, or "random" for offline benchmarking')
     args = ap.parse_args()
 
-    label, p = is_hotdog(args.image, args.threshold)
-    print(f"{label} (p_hotdog={p:.3f})")
-
+    classifier = HotdogClassifier(args.model, args.weights, args.quantize)
+    results, stats = classify_paths(classifier, image_paths(args.images), args.batch_size, args.workers, args.threshold)
+    report(results, stats)
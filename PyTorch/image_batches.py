@@ -0,0 +1,111 @@
+# image_batches.py
+# Batched classification of image folders, shared by the hotdog classifiers.
+# A DataLoader's worker processes open, decode and resize the images while
+# the model works on the previous batch.
+import os
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+
+def image_paths(inputs):
+    # Image files from a mix of file and directory arguments, directories in name order
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths += sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        else:
+            paths.append(path)
+    return paths
+
+
+class ImageFiles(Dataset):
+    def __init__(self, paths, preprocess):
+        self.paths = list(paths)
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        # Runs in a worker process: decode + resize + normalize
+        try:
+            img = Image.open(self.paths[i]).convert("RGB")
+        except OSError:
+            return None  # unreadable image, dropped by skip_unreadable
+        return self.preprocess(img), i
+
+
+def skip_unreadable(batch):
+    batch = [item for item in batch if item is not None]
+    if not batch:
+        return None
+    images, indexes = zip(*batch)
+    return torch.stack(images), list(indexes)
+
+
+def default_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+def classify_paths(classifier, paths, batch_size=32, workers=None, threshold=0.5):
+    """
+    Run classifier.hotdog_probabilities() over the images in batches.
+    Returns ([(path, label, p_hotdog)], stats) where stats has the image
+    count, unreadable images skipped, total seconds and seconds in the model.
+    """
+    workers = default_workers() if workers is None else workers
+    loader = DataLoader(
+        ImageFiles(paths, classifier.preprocess),
+        batch_size=batch_size,
+        num_workers=workers,
+        collate_fn=skip_unreadable,
+        pin_memory=classifier.device == "cuda",
+    )
+
+    results = []
+    model_seconds = 0.0
+    start = time.perf_counter()
+    for batch in loader:
+        if batch is None:
+            continue
+        images, indexes = batch
+        model_start = time.perf_counter()
+        probs = classifier.hotdog_probabilities(images)
+        model_seconds += time.perf_counter() - model_start
+        for i, p in zip(indexes, probs.tolist()):
+            results.append((paths[i], "HOT DOG" if p >= threshold else "NOT HOT DOG", p))
+    stats = {"images": len(results), "skipped": len(paths) - len(results),
+             "seconds": time.perf_counter() - start, "model_seconds": model_seconds}
+    return results, stats
+
+
+def report(results, stats):
+    if len(results) == 1:
+        _, label, p = results[0]
+        print(f"{label} (p_hotdog={p:.3f})")
+    else:
+        for path, label, p in results:
+            print(f"{path}: {label} (p_hotdog={p:.3f})")
+    if stats["skipped"]:
+        print(f"skipped {stats['skipped']} unreadable image(s)")
+    count, seconds, model_seconds = stats["images"], stats["seconds"], stats["model_seconds"]
+    if count > 1 and seconds > 0 and model_seconds > 0:
+        print(f"{count} images in {seconds:.2f}s: {count / seconds:.1f} images/sec "
+              f"(model alone {count / model_seconds:.1f} images/sec)")
+
+
+def add_batch_arguments(ap):
+    ap.add_argument("images", nargs="+", help="image files or directories of images")
+    ap.add_argument("--threshold", type=float, default=0.5, help="probability threshold for HOT DOG")
+    ap.add_argument("--batch-size", type=int, default=32, help="images per batch (default: 32)")
+    ap.add_argument("--workers", type=int, default=default_workers(),
+                    help="DataLoader worker processes for decoding and resizing (0 = main process)")
+    ap.add_argument("--quantize", action="store_true",
+                    help="dynamically quantize the Linear layers to int8 (CPU only)")
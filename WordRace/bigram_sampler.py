@@ -0,0 +1,141 @@
+"""
+Vectorized letter sampling for the WordRace board generators.
+
+The generators used to walk Python lists of (letter, prob) pairs and rebuild
+a combined neighbor distribution for every single cell. Here the bigram table
+is loaded once into a 26x26 NumPy matrix, so a whole row of the board (or a
+whole batch of annealing mutations) is sampled with a handful of array ops:
+
+  - start letters come from an alias table (O(1) per sample)
+  - bigram letters: count the neighbor letters of every cell into an
+    (n, 26) matrix, multiply by the bigram matrix to get each cell's combined
+    distribution, take cumulative sums and pick with one searchsorted call.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LETTER_INDEX = {letter: i for i, letter in enumerate(LETTERS)}
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table: after O(n) setup every sample costs one uniform
+    index plus one coin flip, no matter how many outcomes there are.
+    """
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        w = np.asarray(weights, dtype=np.float64)
+        n = len(w)
+        if n == 0 or w.sum() <= 0:
+            raise ValueError("alias table needs at least one positive weight")
+        scaled = w * (n / w.sum())
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] -= 1.0 - scaled[s]
+            if scaled[g] < 1.0:
+                small.append(g)
+            else:
+                large.append(g)
+        # whatever is left over is 1.0 up to rounding error
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Return `size` outcome indexes."""
+        idx = rng.integers(0, len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[idx]
+        return np.where(keep, idx, self.alias[idx])
+
+
+class BigramSampler:
+    """
+    Precomputed start-letter and bigram distributions for fast sampling.
+
+    start_freq and bigram_freq are the structures returned by
+    load_start_frequencies() and load_bigrams() in the board generators.
+    """
+
+    def __init__(
+        self,
+        start_freq: List[Tuple[str, float]],
+        bigram_freq: Dict[str, Dict[str, float]],
+        seed: Optional[int] = None,
+    ) -> None:
+        self.rng = np.random.default_rng(seed)
+
+        start_weights = np.zeros(len(LETTERS))
+        for letter, p in start_freq:
+            if letter in LETTER_INDEX:
+                start_weights[LETTER_INDEX[letter]] += p
+        self.start_table = AliasTable(start_weights)
+
+        # bigram[x, y] = frequency of y following neighbor letter x
+        self.bigram = np.zeros((len(LETTERS), len(LETTERS)))
+        for first, row in bigram_freq.items():
+            if first not in LETTER_INDEX:
+                continue
+            for second, freq in row.items():
+                if second in LETTER_INDEX:
+                    self.bigram[LETTER_INDEX[first], LETTER_INDEX[second]] = freq
+
+        # fallback when a cell has no usable neighbors: uniform over every
+        # letter that appears in the bigram table at all
+        known = self.bigram.sum(axis=0) > 0
+        if not known.any():
+            known[LETTER_INDEX["A"]] = True
+        self.fallback = known / known.sum()
+
+    def pick_start_letters(self, n: int) -> List[str]:
+        """Pick n letters from the start-letter distribution."""
+        return [LETTERS[i] for i in self.start_table.sample(self.rng, n)]
+
+    def neighbor_counts(self, neighbor_lists: Sequence[Sequence[str]]) -> np.ndarray:
+        """
+        Turn a list of neighbor-letter lists into an (n, 26) count matrix.
+        Empty strings (unfilled cells) and unknown letters are ignored.
+        """
+        counts = np.zeros((len(neighbor_lists), len(LETTERS)))
+        rows = []
+        cols = []
+        for i, letters in enumerate(neighbor_lists):
+            for letter in letters:
+                j = LETTER_INDEX.get(letter)
+                if j is not None:
+                    rows.append(i)
+                    cols.append(j)
+        np.add.at(counts, (rows, cols), 1.0)
+        return counts
+
+    def pick_letters(self, neighbor_lists: Sequence[Sequence[str]]) -> List[str]:
+        """
+        Pick one letter per cell, each weighted by the sum of the bigram
+        frequencies from that cell's neighbors. Vectorized over all cells.
+        """
+        n = len(neighbor_lists)
+        if n == 0:
+            return []
+        weights = self.neighbor_counts(neighbor_lists) @ self.bigram
+        totals = weights.sum(axis=1)
+        empty = totals <= 0
+        if empty.any():
+            weights[empty] = self.fallback
+            totals[empty] = 1.0
+
+        # Normalize each row to [0, 1] and shift row i up by i so all rows
+        # form a single increasing array: one searchsorted samples every row.
+        cum = np.cumsum(weights / totals[:, None], axis=1)
+        cum[:, -1] = 1.0
+        cum += np.arange(n)[:, None]
+        targets = np.arange(n) + self.rng.random(n)
+        picks = np.searchsorted(cum.ravel(), targets, side="right")
+        picks = np.minimum(picks - np.arange(n) * len(LETTERS), len(LETTERS) - 1)
+        return [LETTERS[i] for i in picks]
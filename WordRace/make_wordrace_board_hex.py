@@ -14,6 +14,8 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from reportlab.lib.colors import Color
 
+from bigram_sampler import BigramSampler
+
 ROWS = 13
 COLS = 10
 
@@ -96,64 +98,6 @@ def load_dictionary(filename: str = "dict.txt") -> Tuple[Set[str], Set[str]]:
     return words, prefixes
 
 
-def pick_from_distribution(freq_pairs: List[Tuple[str, float]]) -> str:
-    """
-    freq_pairs is a list of (letter, probability),
-    with probabilities summing to ~1.0.
-    """
-    r = random.random()
-    accum = 0.0
-    for letter, p in freq_pairs:
-        accum += p
-        if r <= accum:
-            return letter
-    return freq_pairs[-1][0]
-
-
-def pick_start_letter(start_freq: List[Tuple[str, float]]) -> str:
-    """
-    Pick a letter using the "start letter" frequencies (already normalized).
-    """
-    return pick_from_distribution(start_freq)
-
-
-def pick_letter_bigrams(
-    bigram_freq: Dict[str, Dict[str, float]], neighbor_letters: List[str]
-) -> str:
-    """
-    Given a set of neighbor letters, compute a weighted distribution of all
-    possible letters based on the sum of bigram frequencies from each neighbor.
-    """
-    candidate_letters = set()
-    for n in neighbor_letters:
-        if n in bigram_freq:
-            candidate_letters.update(bigram_freq[n].keys())
-
-    if not candidate_letters:
-        all_known_letters = set()
-        for first in bigram_freq:
-            all_known_letters.update(bigram_freq[first].keys())
-        if not all_known_letters:
-            return "A"
-        candidate_letters = all_known_letters
-
-    weights = []
-    total_weight = 0.0
-    for letter in candidate_letters:
-        w = 0.0
-        for n in neighbor_letters:
-            w += bigram_freq.get(n, {}).get(letter, 0.0)
-        if w > 0:
-            weights.append((letter, w))
-            total_weight += w
-
-    if total_weight <= 0:
-        return random.choice(sorted(candidate_letters))
-
-    dist = [(letter, w / total_weight) for (letter, w) in weights]
-    return pick_from_distribution(dist)
-
-
 def get_neighbors(r: int, c: int) -> Generator[Tuple[int, int], None, None]:
     """
     Return up to 6 neighbors for hex cell (r,c) in a pointy-top layout.
@@ -247,37 +191,33 @@ def evaluate_board(
     return total_score
 
 
-def generate_initial_board(
-    start_freq: List[Tuple[str, float]], bigram_freq: Dict[str, Dict[str, float]]
-) -> List[List[str]]:
+def generate_initial_board(sampler: BigramSampler) -> List[List[str]]:
     """
     Create a new board of ROWS x COLS letters.
     Fill top row, bottom row, then fill the middle rows in a preset order.
+    Each middle row is sampled in one vectorized call, conditioned on the
+    letters already placed in the rows filled before it.
     """
     board = [["" for _ in range(COLS)] for _ in range(ROWS)]
 
-    for col in range(COLS):
-        board[0][col] = pick_start_letter(start_freq)
-    for col in range(COLS):
-        board[ROWS - 1][col] = pick_start_letter(start_freq)
+    board[0] = sampler.pick_start_letters(COLS)
+    board[ROWS - 1] = sampler.pick_start_letters(COLS)
 
     fill_order = [1, 11, 2, 10, 3, 9, 4, 8, 5, 7, 6]
     for r in fill_order:
         if 0 <= r < ROWS:
+            neighbor_lists = []
             for col in range(COLS):
-                if board[r][col] == "":
-                    neighbor_letters = []
-                    for nr, nc in get_neighbors(r, col):
-                        if board[nr][nc]:
-                            neighbor_letters.append(board[nr][nc])
-                    chosen_letter = pick_letter_bigrams(bigram_freq, neighbor_letters)
-                    board[r][col] = chosen_letter
+                neighbor_lists.append(
+                    [board[nr][nc] for nr, nc in get_neighbors(r, col) if board[nr][nc]]
+                )
+            board[r] = sampler.pick_letters(neighbor_lists)
     return board
 
 
 def simulated_annealing(
     board: List[List[str]],
-    bigram_freq: Dict[str, Dict[str, float]],
+    sampler: BigramSampler,
     dict_words: Set[str],
     dict_prefixes: Set[str],
     start_temp: float = 5.0,
@@ -303,14 +243,17 @@ def simulated_annealing(
 
         new_board = copy.deepcopy(current_board)
 
+        # pick all mutated cells first, then sample their letters in one batch
         n_changes = int(round(T * 5))
-        for _ in range(n_changes):
-            rr = random.randint(0, ROWS - 1)
-            cc = random.randint(0, COLS - 1)
-            neighbor_letters = []
-            for nr, nc in get_neighbors(rr, cc):
-                neighbor_letters.append(new_board[nr][nc])
-            new_letter = pick_letter_bigrams(bigram_freq, neighbor_letters)
+        cells = [
+            (random.randint(0, ROWS - 1), random.randint(0, COLS - 1))
+            for _ in range(n_changes)
+        ]
+        neighbor_lists = [
+            [new_board[nr][nc] for nr, nc in get_neighbors(rr, cc)]
+            for rr, cc in cells
+        ]
+        for (rr, cc), new_letter in zip(cells, sampler.pick_letters(neighbor_lists)):
             new_board[rr][cc] = new_letter
 
         new_score = evaluate_board(new_board, dict_words, dict_prefixes)
@@ -411,15 +354,16 @@ def draw_board(c: canvas.Canvas, board: List[List[str]]) -> None:
 def main() -> None:
     start_freq = load_start_frequencies("start-letter-freqs.txt")
     bigram_freq = load_bigrams("bigram-freqs.txt")
+    sampler = BigramSampler(start_freq, bigram_freq)
     dict_words, dict_prefixes = load_dictionary("dict.txt")
 
-    board = generate_initial_board(start_freq, bigram_freq)
+    board = generate_initial_board(sampler)
     initial_score = evaluate_board(board, dict_words, dict_prefixes)
     print(f"Initial Score: {initial_score}")
 
     best_board, best_score = simulated_annealing(
         board,
-        bigram_freq,
+        sampler,
         dict_words,
         dict_prefixes,
         start_temp=5.0,
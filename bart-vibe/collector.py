@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Transit Location Collector
+
+Long-running replacement for running location_tracker.py by hand: polls
+BART and Caltrain on a fixed schedule and appends every snapshot to the
+SQLite store (see location_store.py).
+
+Usage:
+    uv run collector.py                      # poll every 30s into transit_locations.db
+    uv run collector.py --interval 60 --db data.db
+    uv run collector.py --once --write-json  # one poll, also write transit_locations_*.json
+    uv run collector.py --import-json 'transit_locations_*.json'  # load old files
+    uv run collector.py --replay . --speed 60 --interval 1  # recorded feeds, no network
+"""
+
+import argparse
+import glob
+import os
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from location_store import LocationStore, import_json_files
+from location_tracker import LocationTracker
+
+
+class Collector:
+    def __init__(self, tracker: LocationTracker, store: LocationStore, interval: float = 30,
+                 write_json: bool = False):
+        """
+        Initialize the Collector
+
+        Args:
+            tracker: where locations come from
+            store: where snapshots go
+            interval: seconds between the starts of two polls
+            write_json: also write a transit_locations_*.json file per poll
+        """
+        self.tracker = tracker
+        self.store = store
+        self.interval = interval
+        self.write_json = write_json
+        self.listeners: List[Callable[[int], None]] = []  # called with each new snapshot id
+
+    def poll_once(self) -> Optional[int]:
+        """Fetch one snapshot and store it; returns the snapshot id (None if nothing was found)"""
+        timestamp = datetime.now()
+        all_locations = self.tracker.get_all_locations()
+        locations = all_locations['bart'] + all_locations['caltrain']
+        if not locations:
+            print("⚠️  No location data found, nothing stored")
+            return None
+        snapshot_id = self.store.append_snapshot(locations, timestamp)
+        print(f"✓ Stored snapshot {snapshot_id}: {len(all_locations['bart'])} BART, "
+              f"{len(all_locations['caltrain'])} Caltrain")
+        if self.write_json:
+            self.tracker.save_locations(all_locations['bart'], all_locations['caltrain'])
+        for listener in self.listeners:
+            listener(snapshot_id)
+        return snapshot_id
+
+    def run(self, max_polls: Optional[int] = None):
+        """Poll forever (or max_polls times) on a fixed schedule that does not drift"""
+        next_poll = time.monotonic()
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"✗ Poll failed: {e}")
+            polls += 1
+            next_poll += self.interval
+            delay = next_poll - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.monotonic()  # fell behind; don't burst to catch up
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Poll BART and Caltrain into a SQLite store")
+    parser.add_argument('--db', default='transit_locations.db', help="SQLite file (default: %(default)s)")
+    parser.add_argument('--interval', type=float, default=30, help="seconds between polls (default: 30)")
+    parser.add_argument('--once', action='store_true', help="poll once and exit")
+    parser.add_argument('--write-json', action='store_true',
+                        help="also write transit_locations_*.json files like location_tracker.py")
+    parser.add_argument('--import-json', metavar='GLOB',
+                        help="import existing transit_locations_*.json files and exit")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="read the feeds recorded in DIR instead of the APIs (see replay.py)")
+    parser.add_argument('--speed', type=float, default=60,
+                        help="with --replay, recorded seconds played per second (default: 60)")
+    args = parser.parse_args()
+
+    store = LocationStore(args.db)
+    if args.import_json:
+        count = import_json_files(store, glob.glob(args.import_json))
+        print(f"✓ Imported {count} files into {args.db}")
+        return
+
+    print("🚆 Transit Location Collector")
+    print("=" * 40)
+    if args.replay:
+        from replay import replay_location_tracker
+        tracker = replay_location_tracker(args.replay, args.speed)
+    else:
+        tracker = LocationTracker(os.getenv('CALTRAIN_API_KEY'))
+    collector = Collector(tracker, store, args.interval, args.write_json)
+    try:
+        collector.run(max_polls=1 if args.once else None)
+    except KeyboardInterrupt:
+        print("\n🛑 Collector stopped")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Pooled, concurrent fetching for the GTFS-Realtime feeds
+
+All requests go through one requests.Session, so connections to
+api.bart.gov and api.511.org are kept alive between refreshes instead of
+being set up again for every call. On top of that:
+- responses with an ETag or Last-Modified header are cached, and the next
+  request is conditional; a 304 reuses the cached body
+- for endpoints where several parameter sets may work (511.org), the set
+  that worked is remembered and tried first next time
+- run_concurrently() fetches several feeds at once, so a refresh takes as
+  long as the slowest feed instead of the sum of all of them
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+@dataclass
+class FeedResponse:
+    """Body of a feed response, possibly replayed from the cache"""
+    content: bytes
+    status_code: int
+    not_modified: bool = False  # True when the server answered 304
+    elapsed: float = 0.0  # seconds spent on the request
+
+
+class FeedFetcher:
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = 10,
+                 max_workers: int = 8):
+        """
+        Initialize the Feed Fetcher
+
+        Args:
+            headers: headers sent with every request (e.g. User-Agent)
+            timeout: per-request timeout in seconds
+            max_workers: feeds fetched at once, and connections kept per host
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        # (url, params) -> (etag, last_modified, content)
+        self._validators: Dict[Tuple, Tuple[Optional[str], Optional[str], bytes]] = {}
+        # name -> index of the parameter set that worked last time
+        self.working_params: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='feed-fetch')
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> FeedResponse:
+        """GET url, conditionally if we have seen it before. Raises for HTTP errors."""
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            cached = self._validators.get(key)
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        start = time.perf_counter()
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        elapsed = time.perf_counter() - start
+
+        if response.status_code == 304 and cached:
+            return FeedResponse(cached[2], 304, not_modified=True, elapsed=elapsed)
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with self._lock:
+                self._validators[key] = (etag, last_modified, response.content)
+        return FeedResponse(response.content, response.status_code, elapsed=elapsed)
+
+    def get_first(self, name: str, url: str, params_list: List[Dict[str, str]],
+                  parse: Callable[[bytes], Any]) -> Tuple[Any, int]:
+        """
+        Try each parameter set until one returns a body that parse() accepts.
+        The set that worked is tried first on the next call.
+
+        Returns:
+            (parse result, index of the parameter set used)
+        """
+        order = list(range(len(params_list)))
+        known = self.working_params.get(name)
+        if known is not None and known < len(order):
+            order.remove(known)
+            order.insert(0, known)
+
+        last_error: Optional[Exception] = None
+        for i in order:
+            try:
+                result = parse(self.get(url, params_list[i]).content)
+            except Exception as e:
+                last_error = e
+                continue
+            self.working_params[name] = i
+            return result, i
+        raise last_error or ValueError(f"No parameter sets given for {name}")
+
+    def run_concurrently(self, jobs: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Run every job on the fetch pool and return {name: result}"""
+        futures = {name: self._executor.submit(job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
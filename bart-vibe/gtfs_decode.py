@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Compact GTFS-Realtime decoding for the BART trip updates feed
+
+The trackers used to walk every entity of the parsed feed, build a nested
+dict for every stop_time_update of every trip and then keep only the first
+few, and split every stop_id on '-' to find its station. At rush hour that
+is most of the refresh time. Here:
+- each trip is read into a slotted TripRecord with only the fields the
+  trackers use, and only the first max_stops stop updates are touched
+- StationIndex maps raw stop_ids (with their -1/-2 direction suffixes) to
+  station numbers, normalizing each distinct stop_id once and remembering it;
+  station coordinates live in parallel arrays
+- files written by TransitTracker.save_data() decode to the same records,
+  and can be re-encoded as protobuf, so the whole path can be replayed and
+  benchmarked offline
+"""
+
+import json
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from google.transit import gtfs_realtime_pb2
+
+UNKNOWN = 'Unknown'
+
+
+class StopUpdate(NamedTuple):
+    stop_id: str
+    arrival_delay: Optional[int]
+    arrival_time: Optional[int]
+    departure_delay: Optional[int]
+    departure_time: Optional[int]
+
+
+class TripRecord:
+    """The parts of one trip_update entity the trackers use"""
+    __slots__ = ('entity_id', 'trip_id', 'route_id', 'vehicle_id', 'stop_count', 'stops')
+
+    def __init__(self, entity_id: str, trip_id: str, route_id: str, vehicle_id: str,
+                 stop_count: int, stops: Tuple[StopUpdate, ...]):
+        self.entity_id = entity_id
+        self.trip_id = trip_id
+        self.route_id = route_id
+        self.vehicle_id = vehicle_id
+        self.stop_count = stop_count
+        self.stops = stops  # the first few stop updates only
+
+    def to_train_info(self) -> Dict:
+        """The dict TransitTracker.fetch_bart_data() reports for this trip"""
+        return {
+            'entity_id': self.entity_id,
+            'trip_id': self.trip_id,
+            'route_id': self.route_id,
+            'vehicle_id': self.vehicle_id,
+            'stop_updates_count': self.stop_count,
+            'stop_updates': [stop._asdict() for stop in self.stops]
+        }
+
+    def __repr__(self) -> str:
+        return f"TripRecord(trip_id={self.trip_id!r}, stops={len(self.stops)}/{self.stop_count})"
+
+
+class StationIndex:
+    """Station lookup built once from LocationTracker.bart_station_coords"""
+
+    def __init__(self, station_coords: Dict[str, Dict]):
+        self.codes = list(station_coords)
+        self.names = [station_coords[code]['name'] for code in self.codes]
+        self.lat = array('d', (station_coords[code]['lat'] for code in self.codes))
+        self.lon = array('d', (station_coords[code]['lon'] for code in self.codes))
+        self._by_code = {code: i for i, code in enumerate(self.codes)}
+        self._by_stop_id: Dict[str, int] = {}  # raw stop_id -> station number, -1 if unknown
+
+    def lookup(self, stop_id: str) -> int:
+        """Station number for a raw stop_id like 'A10-1', or -1 if unknown"""
+        station = self._by_stop_id.get(stop_id)
+        if station is None:
+            station = self._by_code.get(station_code(stop_id), -1)
+            self._by_stop_id[stop_id] = station
+        return station
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+def station_code(stop_id: str) -> str:
+    """Station code without the direction suffix ('A10-1' -> 'A10')"""
+    return stop_id.split('-', 1)[0]
+
+
+def _stop_update(stop_update) -> StopUpdate:
+    arrival = stop_update.arrival if stop_update.HasField('arrival') else None
+    departure = stop_update.departure if stop_update.HasField('departure') else None
+    return StopUpdate(
+        stop_update.stop_id if stop_update.HasField('stop_id') else UNKNOWN,
+        arrival.delay if arrival is not None and arrival.HasField('delay') else None,
+        arrival.time if arrival is not None and arrival.HasField('time') else None,
+        departure.delay if departure is not None and departure.HasField('delay') else None,
+        departure.time if departure is not None and departure.HasField('time') else None,
+    )
+
+
+def decode_trip_updates(feed, max_stops: int = 3) -> List[TripRecord]:
+    """TripRecords for every trip_update entity of a parsed FeedMessage"""
+    records = []
+    for entity in feed.entity:
+        if not entity.HasField('trip_update'):
+            continue
+        trip_update = entity.trip_update
+        trip = trip_update.trip
+        vehicle_id = UNKNOWN
+        if trip_update.HasField('vehicle'):
+            vehicle = trip_update.vehicle
+            if vehicle.HasField('id'):
+                vehicle_id = vehicle.id
+            elif vehicle.HasField('label'):
+                vehicle_id = vehicle.label
+        stop_time_updates = trip_update.stop_time_update
+        records.append(TripRecord(
+            entity.id,
+            trip.trip_id if trip.HasField('trip_id') else UNKNOWN,
+            trip.route_id if trip.HasField('route_id') else UNKNOWN,
+            vehicle_id,
+            len(stop_time_updates),
+            tuple(_stop_update(stop_time_updates[i]) for i in range(min(max_stops, len(stop_time_updates)))),
+        ))
+    return records
+
+
+def parse_feed(content: bytes):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+    return feed
+
+
+def load_saved_trips(filename: str) -> Tuple[Dict, List[TripRecord]]:
+    """
+    Read a bart_trips_*.json file written by TransitTracker.save_data().
+    Returns (the file's trip_updates header, TripRecords).
+    """
+    with open(filename) as f:
+        data = json.load(f)
+    records = []
+    for train in data.get('trains', []):
+        stops = tuple(StopUpdate(**stop) for stop in train.get('stop_updates', []))
+        records.append(TripRecord(
+            train.get('entity_id', train['trip_id']),
+            train['trip_id'],
+            train.get('route_id', UNKNOWN),
+            train.get('vehicle_id', UNKNOWN),
+            train.get('stop_updates_count', len(stops)),
+            stops,
+        ))
+    return data.get('trip_updates') or {}, records
+
+
+def encode_trip_updates(records: Iterable[TripRecord], feed_timestamp: int = 0) -> bytes:
+    """
+    Serialize TripRecords as a GTFS-RT FeedMessage, the format the BART API
+    returns, so saved data can be fed back through the protobuf decode path.
+    Only the stop updates the records kept are written.
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = int(feed_timestamp or 0)
+    for record in records:
+        entity = feed.entity.add()
+        entity.id = record.entity_id
+        trip_update = entity.trip_update
+        if record.trip_id != UNKNOWN:
+            trip_update.trip.trip_id = record.trip_id
+        if record.route_id != UNKNOWN:
+            trip_update.trip.route_id = record.route_id
+        if record.vehicle_id != UNKNOWN:
+            trip_update.vehicle.id = record.vehicle_id
+        for stop in record.stops:
+            stop_update = trip_update.stop_time_update.add()
+            if stop.stop_id != UNKNOWN:
+                stop_update.stop_id = stop.stop_id
+            for event, delay, time in ((stop_update.arrival, stop.arrival_delay, stop.arrival_time),
+                                       (stop_update.departure, stop.departure_delay, stop.departure_time)):
+                if delay is not None:
+                    event.delay = delay
+                if time is not None:
+                    event.time = time
+    return feed.SerializeToString()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Time-series store for transit location snapshots
+
+Instead of one pretty-printed transit_locations_*.json file per poll, every
+snapshot is appended to a SQLite database:
+- snapshots: one row per poll (timestamp and counts)
+- positions: one compact row per vehicle per poll
+Indexes on (vehicle_id, ts) and on the snapshot timestamp make the two
+common questions cheap:
+- where was vehicle X between t1 and t2?   -> vehicle_track()
+- where was every vehicle at time t?        -> vehicles_at()
+
+Timestamps are stored as Unix epoch seconds; the query methods accept
+either epoch seconds or datetime objects.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+TimeValue = Union[float, int, datetime, str]
+
+# location dict keys stored as columns, in column order
+POSITION_FIELDS = ('system', 'vehicle_id', 'latitude', 'longitude', 'station',
+                   'delay_seconds', 'speed_mps', 'bearing', 'gps_source', 'path')
+JSON_FIELDS = ('path',)  # stored as JSON text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    bart_count INTEGER NOT NULL,
+    caltrain_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_snapshots_ts ON snapshots (ts);
+
+CREATE TABLE IF NOT EXISTS positions (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    ts REAL NOT NULL,
+    system TEXT NOT NULL,
+    vehicle_id TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    station TEXT,
+    delay_seconds INTEGER,
+    speed_mps REAL,
+    bearing REAL,
+    gps_source TEXT,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_positions_vehicle_ts ON positions (vehicle_id, ts);
+CREATE INDEX IF NOT EXISTS ix_positions_snapshot ON positions (snapshot_id);
+"""
+
+
+def to_epoch(value: TimeValue) -> float:
+    """Epoch seconds from epoch seconds, a datetime or an ISO 8601 string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class LocationStore:
+    def __init__(self, path: str = 'transit_locations.db'):
+        """
+        Open (or create) the store
+
+        Args:
+            path: SQLite database file (':memory:' for a throwaway store)
+        """
+        self.path = path
+        # shared between the collector and server threads, guarded by _lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            # databases created before a column was added
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(positions)")}
+            for field in POSITION_FIELDS:
+                if field not in columns:
+                    self.conn.execute(f"ALTER TABLE positions ADD COLUMN {field}")
+
+    def append_snapshot(self, locations: List[Dict], timestamp: Optional[TimeValue] = None) -> int:
+        """Store one poll's locations in a single transaction; returns the snapshot id"""
+        ts = to_epoch(timestamp) if timestamp is not None else datetime.now().timestamp()
+        bart_count = sum(1 for loc in locations if loc.get('system') == 'BART')
+        rows = [(ts,) + tuple(self._column(loc, field) for field in POSITION_FIELDS) for loc in locations]
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO snapshots (ts, bart_count, caltrain_count) VALUES (?, ?, ?)",
+                (ts, bart_count, len(locations) - bart_count))
+            snapshot_id = cursor.lastrowid
+            self.conn.executemany(
+                f"INSERT INTO positions (snapshot_id, ts, {', '.join(POSITION_FIELDS)}) "
+                f"VALUES ({snapshot_id}, {', '.join('?' * (len(POSITION_FIELDS) + 1))})",
+                rows)
+        return snapshot_id
+
+    def import_json_file(self, filename: str) -> int:
+        """Import a transit_locations_*.json file written by LocationTracker.save_locations"""
+        with open(filename) as f:
+            data = json.load(f)
+        return self.append_snapshot(data['locations'], data['timestamp'])
+
+    def vehicle_track(self, vehicle_id: str, start: TimeValue, end: TimeValue) -> List[Dict]:
+        """Every recorded position of one vehicle with start <= timestamp <= end, oldest first"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM positions WHERE vehicle_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (vehicle_id, to_epoch(start), to_epoch(end))).fetchall()
+        return [self._location(row) for row in rows]
+
+    def vehicles_at(self, when: TimeValue) -> List[Dict]:
+        """Every vehicle in the most recent snapshot taken at or before `when`"""
+        with self._lock:
+            snapshot = self.conn.execute(
+                "SELECT id FROM snapshots WHERE ts <= ? ORDER BY ts DESC, id DESC LIMIT 1",
+                (to_epoch(when),)).fetchone()
+            if snapshot is None:
+                return []
+            rows = self.conn.execute(
+                "SELECT * FROM positions WHERE snapshot_id = ?", (snapshot['id'],)).fetchall()
+        return [self._location(row) for row in rows]
+
+    def latest_snapshot_id(self) -> Optional[int]:
+        """Id of the snapshot latest_snapshot() returns; a cheap way to notice new data"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id FROM snapshots ORDER BY ts DESC, id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def latest_snapshot(self) -> Optional[Dict]:
+        """The newest snapshot in the same shape save_locations() writes, or None"""
+        with self._lock:
+            snapshot = self.conn.execute(
+                "SELECT * FROM snapshots ORDER BY ts DESC, id DESC LIMIT 1").fetchone()
+            if snapshot is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT * FROM positions WHERE snapshot_id = ?", (snapshot['id'],)).fetchall()
+        return {
+            'timestamp': datetime.fromtimestamp(snapshot['ts']).isoformat(),
+            'total_vehicles': snapshot['bart_count'] + snapshot['caltrain_count'],
+            'bart_count': snapshot['bart_count'],
+            'caltrain_count': snapshot['caltrain_count'],
+            'locations': [self._location(row, with_timestamp=False) for row in rows],
+        }
+
+    def snapshot_times(self, start: Optional[TimeValue] = None,
+                       end: Optional[TimeValue] = None) -> List[float]:
+        """Timestamps of the stored snapshots, oldest first"""
+        low = to_epoch(start) if start is not None else float('-inf')
+        high = to_epoch(end) if end is not None else float('inf')
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT ts FROM snapshots WHERE ts BETWEEN ? AND ? ORDER BY ts", (low, high)).fetchall()
+        return [row['ts'] for row in rows]
+
+    @staticmethod
+    def _column(location: Dict, field: str):
+        value = location.get(field)
+        if field in JSON_FIELDS and value is not None:
+            return json.dumps(value, separators=(',', ':'))
+        return value
+
+    @staticmethod
+    def _location(row: sqlite3.Row, with_timestamp: bool = True) -> Dict:
+        # only the keys the tracker produced for this system (None = absent)
+        location = {field: row[field] for field in POSITION_FIELDS if row[field] is not None}
+        for field in JSON_FIELDS:
+            if field in location:
+                location[field] = json.loads(location[field])
+        if with_timestamp:
+            location['timestamp'] = row['ts']
+        return location
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def import_json_files(store: LocationStore, filenames: Iterable[str]) -> int:
+    """Import several save_locations() files; returns how many were imported"""
+    count = 0
+    for filename in sorted(filenames):
+        store.import_json_file(filename)
+        count += 1
+    return count
@@ -9,19 +9,23 @@ This program fetches real-time train locations from:
 Outputs simplified location data for map display.
 """
 
-import requests
 import json
 import os
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 from google.transit import gtfs_realtime_pb2
 
+from feed_fetcher import FeedFetcher
+from gtfs_decode import StationIndex, decode_trip_updates, station_code
+from train_positions import TrainPositions
+
 class LocationTracker:
-    def __init__(self, caltrain_api_key: str = None):
+    def __init__(self, caltrain_api_key: str = None, fetcher: Optional[FeedFetcher] = None):
         """Initialize the Location Tracker"""
         self.bart_trip_updates_url = "http://api.bart.gov/gtfsrt/tripupdate.aspx"
         self.caltrain_api_key = caltrain_api_key
         self.caltrain_vehicle_url = "https://api.511.org/transit/VehiclePositions"
+        self.fetcher = fetcher or FeedFetcher()
         
         # BART station coordinates (approximate center positions)
         self.bart_station_coords = {
@@ -151,48 +155,36 @@ class LocationTracker:
             'C60': {'lat': 37.8518, 'lon': -122.2699, 'name': 'Ashby'},
             'M40': {'lat': 37.5349, 'lon': -121.8890, 'name': 'Newark'},
         }
+        # stop_id -> station lookups, normalized once per distinct stop_id
+        self.station_index = StationIndex(self.bart_station_coords)
+        # BART trains placed between stations from their stop times, kept across polls
+        self.train_positions = TrainPositions(self.station_index)
 
     def get_bart_locations(self) -> List[Dict]:
-        """Get BART train locations (estimated from next station, not real GPS)"""
+        """Get BART train locations (interpolated from stop times, not real GPS)"""
         locations = []
         
         try:
             print("Fetching BART train locations...")
-            print("  Note: BART doesn't provide real GPS coordinates, estimating from stations")
-            response = requests.get(self.bart_trip_updates_url, timeout=10)
-            response.raise_for_status()
+            print("  Note: BART doesn't provide real GPS coordinates, estimating from stop times")
+            response = self.fetcher.get(self.bart_trip_updates_url)
             
             feed = gtfs_realtime_pb2.FeedMessage()
             feed.ParseFromString(response.content)
             
-            for entity in feed.entity:
-                if entity.HasField('trip_update'):
-                    trip_update = entity.trip_update
-                    
-                    # Get the next stop to estimate train location
-                    if trip_update.stop_time_update:
-                        next_stop = trip_update.stop_time_update[0]
-                        stop_id = next_stop.stop_id
-                        
-                        # Extract station code
-                        station_code = stop_id.split('-')[0] if '-' in stop_id else stop_id
-                        
-                        if station_code in self.bart_station_coords:
-                            coord = self.bart_station_coords[station_code]
-                            
-                            location = {
-                                'system': 'BART',
-                                'vehicle_id': trip_update.trip.trip_id,
-                                'latitude': coord['lat'],
-                                'longitude': coord['lon'],
-                                'station': coord['name'],
-                                'delay_seconds': next_stop.arrival.delay if next_stop.HasField('arrival') and next_stop.arrival.HasField('delay') else 0,
-                                'gps_source': 'estimated_from_station'  # Indicate this is not real GPS
-                            }
-                            locations.append(location)
-                        else:
-                            # Log unknown station codes to help identify missing stations
-                            print(f"  Unknown station code: {station_code} (full stop_id: {stop_id})")
+            records = []
+            for record in decode_trip_updates(feed, max_stops=self.train_positions.max_stops):
+                if not record.stops:
+                    continue
+                next_stop = record.stops[0]
+                if self.station_index.lookup(next_stop.stop_id) >= 0:
+                    records.append(record)
+                else:
+                    # Log unknown station codes to help identify missing stations
+                    print(f"  Unknown station code: {station_code(next_stop.stop_id)} (full stop_id: {next_stop.stop_id})")
+            
+            self.train_positions.update(records)
+            locations = self.train_positions.locations()
             
             print(f"✓ Found {len(locations)} BART train locations (estimated)")
             
@@ -220,48 +212,15 @@ class LocationTracker:
                 {'api_key': self.caltrain_api_key}
             ]
             
-            for i, params in enumerate(params_list):
-                try:
-                    print(f"  Trying parameter set {i+1}...")
-                    response = requests.get(self.caltrain_vehicle_url, params=params, timeout=10)
-                    
-                    if response.status_code == 200:
-                        print(f"  ✓ Success with parameter set {i+1}")
-                        
-                        # Try to parse as GTFS-RT
-                        try:
-                            feed = gtfs_realtime_pb2.FeedMessage()
-                            feed.ParseFromString(response.content)
-                            
-                            for entity in feed.entity:
-                                if entity.HasField('vehicle') and entity.vehicle.HasField('position'):
-                                    vehicle = entity.vehicle
-                                    pos = vehicle.position
-                                    
-                                    if pos.HasField('latitude') and pos.HasField('longitude'):
-                                        location = {
-                                            'system': 'Caltrain',
-                                            'vehicle_id': vehicle.vehicle.id if vehicle.vehicle.HasField('id') else f"train_{entity.id}",
-                                            'latitude': pos.latitude,
-                                            'longitude': pos.longitude,
-                                            'speed_mps': pos.speed if pos.HasField('speed') else None,
-                                            'bearing': pos.bearing if pos.HasField('bearing') else None
-                                        }
-                                        locations.append(location)
-                            break
-                            
-                        except Exception as parse_error:
-                            print(f"  ✗ Parse error: {parse_error}")
-                            # Try to see what we actually got
-                            print(f"  Response content type: {response.headers.get('content-type', 'unknown')}")
-                            print(f"  Response length: {len(response.content)} bytes")
-                            
-                    else:
-                        print(f"  ✗ HTTP {response.status_code}: {response.reason}")
-                        
-                except requests.exceptions.RequestException as req_error:
-                    print(f"  ✗ Request error: {req_error}")
-                    continue
+            def parse(content: bytes) -> List[Dict]:
+                feed = gtfs_realtime_pb2.FeedMessage()
+                feed.ParseFromString(content)
+                return self._caltrain_locations_from_feed(feed)
+
+            # The parameter set that worked last time is tried first
+            locations, i = self.fetcher.get_first('caltrain_vehicles', self.caltrain_vehicle_url,
+                                                  params_list, parse)
+            print(f"  ✓ Success with parameter set {i+1}")
             
             print(f"✓ Found {len(locations)} Caltrain vehicle locations")
             
@@ -270,6 +229,32 @@ class LocationTracker:
         
         return locations
 
+    def _caltrain_locations_from_feed(self, feed) -> List[Dict]:
+        locations = []
+        for entity in feed.entity:
+            if entity.HasField('vehicle') and entity.vehicle.HasField('position'):
+                vehicle = entity.vehicle
+                pos = vehicle.position
+                
+                if pos.HasField('latitude') and pos.HasField('longitude'):
+                    location = {
+                        'system': 'Caltrain',
+                        'vehicle_id': vehicle.vehicle.id if vehicle.vehicle.HasField('id') else f"train_{entity.id}",
+                        'latitude': pos.latitude,
+                        'longitude': pos.longitude,
+                        'speed_mps': pos.speed if pos.HasField('speed') else None,
+                        'bearing': pos.bearing if pos.HasField('bearing') else None
+                    }
+                    locations.append(location)
+        return locations
+
+    def get_all_locations(self) -> Dict[str, List[Dict]]:
+        """Fetch BART and Caltrain locations concurrently"""
+        return self.fetcher.run_concurrently({
+            'bart': self.get_bart_locations,
+            'caltrain': self.get_caltrain_locations,
+        })
+
     def save_locations(self, bart_locations: List[Dict], caltrain_locations: List[Dict]):
         """Save location data to JSON file"""
         timestamp = datetime.now()
@@ -303,9 +288,10 @@ def main():
     
     tracker = LocationTracker(caltrain_api_key)
     
-    # Fetch location data
-    bart_locations = tracker.get_bart_locations()
-    caltrain_locations = tracker.get_caltrain_locations()
+    # Fetch location data (both systems at once)
+    all_locations = tracker.get_all_locations()
+    bart_locations = all_locations['bart']
+    caltrain_locations = all_locations['caltrain']
     
     # Display summary
     total = len(bart_locations) + len(caltrain_locations)
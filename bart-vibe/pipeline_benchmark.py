@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the location pipeline, on recorded data
+
+Replays the recorded feeds (see replay.py) as fast as possible, one frame
+after another, and times each stage on its own:
+  - parse      protobuf bytes -> FeedMessage -> TripRecords / vehicles
+  - locate     TripRecords -> interpolated BART positions, Caltrain locations
+  - serialize  SnapshotHub.publish: JSON, gzip, ETag and delta for SSE
+  - serve      GET /api/latest from concurrent clients against the real
+               TransitHTTPServer (full gzipped responses and 304s)
+and then the whole path end to end: LocationTracker.get_all_locations()
+through the replay fetcher, then publish.
+
+No network access or API keys needed:
+
+    uv run pipeline_benchmark.py
+    uv run pipeline_benchmark.py --rounds 50 --clients 16 --requests 500
+    uv run pipeline_benchmark.py --profile   # cProfile of the end-to-end loop
+"""
+
+import argparse
+import contextlib
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+from typing import Callable, List
+
+import requests
+from google.transit import gtfs_realtime_pb2
+
+from gtfs_decode import decode_trip_updates
+from location_tracker import LocationTracker
+from replay import ReplayFetcher, load_recording
+from server import SnapshotHub, TransitHTTPRequestHandler, TransitHTTPServer
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timed(count: int, work: Callable[[], None]) -> float:
+    """Seconds per call of work(), over count calls"""
+    start = time.perf_counter()
+    for _ in range(count):
+        work()
+    return (time.perf_counter() - start) / count
+
+
+def report(name: str, seconds_per_op: float, unit: str):
+    print(f"  {name:<10} {seconds_per_op * 1000:9.3f} ms/{unit:<8} {1 / seconds_per_op:10.1f} {unit}s/s")
+
+
+def snapshot_of(locations: dict) -> dict:
+    """The snapshot LocationStore.latest_snapshot() would return for these locations"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_vehicles': len(locations['bart']) + len(locations['caltrain']),
+        'bart_count': len(locations['bart']),
+        'caltrain_count': len(locations['caltrain']),
+        'locations': locations['bart'] + locations['caltrain'],
+    }
+
+
+def parse(frame) -> tuple:
+    bart = gtfs_realtime_pb2.FeedMessage()
+    bart.ParseFromString(frame.feeds.get('bart_trips', b''))
+    caltrain = gtfs_realtime_pb2.FeedMessage()
+    caltrain.ParseFromString(frame.feeds.get('caltrain', b''))
+    return decode_trip_updates(bart, max_stops=3), caltrain
+
+
+def bench_stages(frames, tracker: LocationTracker, rounds: int) -> List[dict]:
+    """Time parse, locate and serialize over every frame; returns the snapshots"""
+    count = rounds * len(frames)
+    parsed = [parse(frame) for frame in frames]
+    report('parse', timed(rounds, lambda: [parse(frame) for frame in frames]) / len(frames), 'frame')
+
+    positions = tracker.train_positions
+
+    def locate(i):
+        records, caltrain = parsed[i]
+        positions.update(records)
+        return {'bart': positions.locations(frames[i].time),
+                'caltrain': tracker._caltrain_locations_from_feed(caltrain)}
+
+    located = [locate(i) for i in range(len(frames))]
+    report('locate', timed(rounds, lambda: [locate(i) for i in range(len(frames))]) / len(frames), 'frame')
+
+    snapshots = [snapshot_of(locations) for locations in located]
+    hub = SnapshotHub()
+    cycle = itertools.cycle(snapshots)
+    report('serialize', timed(count, lambda: hub.publish(next(cycle))), 'frame')
+    return snapshots
+
+
+def bench_serve(snapshot: dict, clients: int, requests_per_client: int):
+    """Concurrent GET /api/latest against a TransitHTTPServer on a free port"""
+    hub = SnapshotHub()
+    hub.publish(snapshot)
+
+    class Handler(TransitHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    Handler.hub = hub
+    server = TransitHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/api/latest'
+    _, _, etag = hub.latest()
+
+    for label, headers in (('full', {}), ('304', {'If-None-Match': etag})):
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def client():
+            mine = []
+            with requests.Session() as session:
+                for _ in range(requests_per_client):
+                    start = time.perf_counter()
+                    response = session.get(url, headers=headers)
+                    response.content
+                    mine.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        ordered = sorted(latencies)
+        print(f"  serve {label:<4} {len(ordered) / elapsed:10.1f} req/s  latency ms "
+              f"p50 {percentile(ordered, 0.50) * 1000:.2f}  p99 {percentile(ordered, 0.99) * 1000:.2f}")
+
+    server.shutdown()
+    server.server_close()
+
+
+def bench_pipeline(frames, rounds: int, profile: bool):
+    """fetch (replayed) -> parse -> locate -> publish, frame after frame"""
+    # with --profile the feeds are fetched on this thread, where cProfile can see them
+    fetcher = ReplayFetcher(frames, speed=0, concurrent=not profile)
+    tracker = LocationTracker(caltrain_api_key='replay', fetcher=fetcher)
+    tracker.train_positions.clock = fetcher.now
+    hub = SnapshotHub()
+
+    def step():
+        hub.publish(snapshot_of(tracker.get_all_locations()))
+        fetcher.advance()
+
+    profiler = cProfile.Profile() if profile else None
+    with contextlib.redirect_stdout(io.StringIO()):  # the trackers report every fetch
+        if profiler:
+            profiler.enable()
+        seconds = timed(rounds * len(frames), step)
+        if profiler:
+            profiler.disable()
+    report('pipeline', seconds, 'frame')
+    fetcher.close()
+    if profiler:
+        print()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse -> locate -> serialize -> serve on recorded feeds")
+    parser.add_argument('--dir', default='.', help="directory with the recorded files (default: .)")
+    parser.add_argument('--rounds', type=int, default=20, help="passes over the recording (default: 20)")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent HTTP clients (default: 8)")
+    parser.add_argument('--requests', type=int, default=200, help="requests per client (default: 200)")
+    parser.add_argument('--profile', action='store_true', help="profile the end-to-end loop")
+    args = parser.parse_args()
+
+    frames = load_recording(args.dir)
+    if not frames:
+        parser.error(f"no recorded feeds in {args.dir}")
+    tracker = LocationTracker(caltrain_api_key='replay')
+
+    print(f"{len(frames)} frames, {args.rounds} rounds")
+    snapshots = bench_stages(frames, tracker, args.rounds)
+    largest = max(snapshots, key=lambda s: s['total_vehicles'])
+    print(f"  (largest snapshot: {largest['total_vehicles']} vehicles)")
+    bench_serve(largest, args.clients, args.requests)
+    bench_pipeline(frames, args.rounds, args.profile)
+
+
+if __name__ == "__main__":
+    main()
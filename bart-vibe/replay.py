@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Offline replay of recorded feeds
+
+Turns the files TransitTracker.save_data() and LocationTracker.save_locations()
+left behind back into the GTFS-Realtime protobuf the APIs return, and serves
+them through a FeedFetcher stand-in. The trackers run their normal parsing and
+locating code on it, without network access or API keys:
+- bart_trips_*.json          -> BART trip updates
+- bart_vehicles_*.json       -> BART vehicle positions
+- caltrain_data_*.json and the Caltrain vehicles in transit_locations_*.json
+                             -> 511 Caltrain vehicle positions
+Every file is one frame of the recording. A frame holds the newest recording
+of each feed up to that moment, so feeds recorded at different times combine.
+
+ReplayFetcher plays the frames back `speed` times faster than they were
+recorded, looping at the end, or one frame per advance() call with speed=0.
+
+Usage:
+    uv run collector.py --replay . --speed 60 --interval 1 --db replay.db
+    uv run server.py --replay . --speed 60
+"""
+
+import glob
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from google.transit import gtfs_realtime_pb2
+
+from feed_fetcher import FeedFetcher, FeedResponse
+from gtfs_decode import encode_trip_updates, load_saved_trips
+from location_tracker import LocationTracker
+
+# URL path -> feed name, for the URLs the trackers request
+FEED_PATHS = {
+    '/gtfsrt/tripupdate.aspx': 'bart_trips',
+    '/gtfsrt/vehiclepositions.aspx': 'bart_vehicles',
+    '/transit/VehiclePositions': 'caltrain',
+}
+FILENAME_TIME = re.compile(r'_(\d{8}_\d{6})\.json$')
+
+
+@dataclass
+class Frame:
+    """The feeds as they were at one moment of the recording"""
+    time: float  # epoch seconds
+    feeds: Dict[str, bytes]  # feed name -> protobuf body
+    source: str  # file that changed this frame
+
+
+def encode_vehicle_positions(vehicles: Iterable[Dict], feed_timestamp: float = 0) -> bytes:
+    """
+    Serialize vehicle dicts (caltrain_data trains, bart_vehicles vehicles or
+    Caltrain location dicts) as a GTFS-RT VehiclePositions FeedMessage
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = int(feed_timestamp or 0)
+    for i, vehicle in enumerate(vehicles):
+        entity = feed.entity.add()
+        entity.id = str(vehicle.get('entity_id', i))
+        position = entity.vehicle
+        if vehicle.get('vehicle_id') not in (None, 'Unknown'):
+            position.vehicle.id = str(vehicle['vehicle_id'])
+        for field in ('trip_id', 'route_id'):
+            if vehicle.get(field) not in (None, 'Unknown'):
+                setattr(position.trip, field, vehicle[field])
+        if vehicle.get('latitude') is not None and vehicle.get('longitude') is not None:
+            position.position.latitude = vehicle['latitude']
+            position.position.longitude = vehicle['longitude']
+        speed = vehicle.get('speed_mps', vehicle.get('speed'))
+        if speed is not None:
+            position.position.speed = speed
+        if vehicle.get('bearing') is not None:
+            position.position.bearing = vehicle['bearing']
+        if vehicle.get('timestamp') is not None:
+            position.timestamp = int(vehicle['timestamp'])
+    return feed.SerializeToString()
+
+
+def _file_time(filename: str) -> Optional[float]:
+    match = FILENAME_TIME.search(filename)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').timestamp()
+
+
+def _read_recording(filename: str):
+    """(feed name, protobuf body, BART feed timestamp or None) for one file, or None"""
+    name = os.path.basename(filename)
+    if name.startswith('bart_trips_'):
+        header, records = load_saved_trips(filename)
+        feed_timestamp = header.get('feed_timestamp')
+        return 'bart_trips', encode_trip_updates(records, feed_timestamp or 0), feed_timestamp
+    with open(filename) as f:
+        data = json.load(f)
+    if name.startswith('bart_vehicles_'):
+        vehicles = data.get('vehicles') or []
+        return ('bart_vehicles', encode_vehicle_positions(vehicles), None) if vehicles else None
+    if name.startswith('caltrain_data_'):
+        trains = data.get('trains') or []
+        return ('caltrain', encode_vehicle_positions(trains), None) if trains else None
+    if name.startswith('transit_locations_'):
+        vehicles = [loc for loc in data.get('locations', []) if loc.get('system') == 'Caltrain']
+        return ('caltrain', encode_vehicle_positions(vehicles), None) if vehicles else None
+    return None
+
+
+def load_recording(directory: str = '.') -> List[Frame]:
+    """Frames from every recorded file in directory, oldest first"""
+    recordings = []
+    for pattern in ('bart_trips_*.json', 'bart_vehicles_*.json', 'caltrain_data_*.json',
+                    'transit_locations_*.json'):
+        for filename in glob.glob(os.path.join(directory, pattern)):
+            file_time = _file_time(filename)
+            recording = _read_recording(filename) if file_time is not None else None
+            if recording:
+                recordings.append((file_time, filename) + recording)
+    recordings.sort()
+
+    # Filenames are in the recording machine's local time, the BART feed
+    # timestamps are UTC epochs: shift file times by the time zone difference
+    # so "now" during a replay matches the arrival times in the trip updates
+    differences = [feed_ts - file_time for file_time, _, _, _, feed_ts in recordings if feed_ts]
+    shift = round(statistics.median(differences) / 900) * 900 if differences else 0
+
+    frames = []
+    feeds: Dict[str, bytes] = {}
+    for file_time, filename, name, body, _ in recordings:
+        feeds = {**feeds, name: body}
+        frames.append(Frame(file_time + shift, feeds, filename))
+    return frames
+
+
+class ReplayFetcher(FeedFetcher):
+    def __init__(self, frames: List[Frame], speed: float = 60.0, loop: bool = True,
+                 clock: Callable[[], float] = time.monotonic, concurrent: bool = True):
+        """
+        Initialize the Replay Fetcher
+
+        Args:
+            frames: from load_recording()
+            speed: recorded seconds played per real second; 0 plays one frame
+                   per advance() call
+            loop: start over after the last frame
+            clock: monotonic clock the speed is measured against
+            concurrent: False runs run_concurrently() jobs one after another
+                        on the calling thread (so a profiler sees them)
+        """
+        super().__init__()
+        if not frames:
+            raise ValueError("Nothing to replay: no recorded files found")
+        self.frames = frames
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self.concurrent = concurrent
+        self.started = clock()
+        self.position = 0  # frame index in step mode
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return self.frames[-1].time - self.frames[0].time
+
+    def now(self) -> float:
+        """The moment of the recording being played, in epoch seconds"""
+        if not self.speed:
+            return self.frames[self.position].time
+        elapsed = (self.clock() - self.started) * self.speed
+        if self.loop and self.duration > 0:
+            elapsed %= self.duration
+        return self.frames[0].time + elapsed
+
+    def wall_time(self, recorded: float) -> float:
+        """
+        The epoch time at which the playback reaches `recorded`, so keyframes
+        sent to a browser animate against its own clock at playback speed
+        """
+        return time.time() + (recorded - self.now()) / (self.speed or 1)
+
+    def frame(self) -> Frame:
+        """The frame being played"""
+        if not self.speed:
+            return self.frames[self.position]
+        now = self.now()
+        current = self.frames[0]
+        for frame in self.frames:
+            if frame.time > now:
+                break
+            current = frame
+        return current
+
+    def advance(self) -> bool:
+        """Step mode: move to the next frame; returns False after the last one (unless looping)"""
+        if self.position + 1 < len(self.frames):
+            self.position += 1
+            return True
+        if self.loop:
+            self.position = 0
+            return True
+        return False
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> FeedResponse:
+        """The recorded body for url; a 404 HTTPError when that feed wasn't recorded"""
+        with self._count_lock:
+            self.requests += 1
+        name = FEED_PATHS.get(urlparse(url).path)
+        content = self.frame().feeds.get(name) if name else None
+        if content is None:
+            raise requests.exceptions.HTTPError(f"404 Client Error: no recording of {url}")
+        return FeedResponse(content, 200)
+
+    def run_concurrently(self, jobs: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        if self.concurrent:
+            return super().run_concurrently(jobs)
+        return {name: job() for name, job in jobs.items()}
+
+
+def replay_location_tracker(directory: str = '.', speed: float = 60.0, loop: bool = True):
+    """A LocationTracker that reads the recordings in directory instead of the APIs"""
+    fetcher = ReplayFetcher(load_recording(directory), speed, loop)
+    tracker = LocationTracker(caltrain_api_key='replay', fetcher=fetcher)
+    tracker.train_positions.clock = fetcher.now
+    tracker.train_positions.path_time = fetcher.wall_time
+    return tracker
@@ -1,20 +1,159 @@
 #!/usr/bin/env python3
 """
-Simple HTTP server for the transit map
+HTTP server for the transit map
+
+Serves map.html and the data files, plus two endpoints backed by the
+newest snapshot held in memory:
+- /api/latest   the newest snapshot as JSON, gzipped when the client accepts
+                it, with an ETag so unchanged data costs a 304
+- /api/events   Server-Sent Events: the full snapshot on connect, then only
+                what changed (added, moved and removed vehicles) whenever
+                the collector stores a new snapshot
+
+New snapshots are picked up from the collector's SQLite store
+(transit_locations.db), or, when there is no store, from the newest
+transit_locations_*.json file.
 """
 
+import argparse
+import gzip
+import hashlib
 import http.server
-import socketserver
-import webbrowser
+import json
 import os
+import threading
+import webbrowser
+from collections import deque
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 PORT = 8000
+DB_PATH = 'transit_locations.db'
+WATCH_SECONDS = 2  # how often to look for a new snapshot
+KEEPALIVE_SECONDS = 15  # idle /api/events streams get a comment this often
+DELTA_HISTORY = 100  # deltas kept for clients reconnecting with Last-Event-ID
+
+
+def vehicle_key(location: Dict) -> str:
+    return f"{location['system']}:{location['vehicle_id']}"
+
+
+def snapshot_delta(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict[str, List]:
+    """What changed between two {vehicle_key: location} maps"""
+    return {
+        'added': [loc for key, loc in new.items() if key not in old],
+        'moved': [loc for key, loc in new.items() if key in old and old[key] != loc],
+        'removed': [key for key in old if key not in new],
+    }
+
+
+class SnapshotHub:
+    """The newest snapshot, pre-encoded, plus recent deltas for /api/events"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.body: Optional[bytes] = None
+        self.gzip_body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self._vehicles: Dict[str, Dict] = {}
+        self._deltas = deque(maxlen=DELTA_HISTORY)  # (version, delta JSON)
+
+    def publish(self, snapshot: Dict) -> bool:
+        """Make snapshot the latest one; returns False if nothing changed"""
+        body = json.dumps(snapshot, separators=(',', ':')).encode()
+        vehicles = {vehicle_key(loc): loc for loc in snapshot['locations']}
+        with self._cond:
+            if body == self.body:
+                return False
+            delta = snapshot_delta(self._vehicles, vehicles)
+            delta.update({key: snapshot.get(key) for key in
+                          ('timestamp', 'total_vehicles', 'bart_count', 'caltrain_count')})
+            self.version += 1
+            self.body = body
+            self.gzip_body = gzip.compress(body)
+            self.etag = f'"{self.version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+            self._vehicles = vehicles
+            self._deltas.append((self.version, json.dumps(delta, separators=(',', ':'))))
+            self._cond.notify_all()
+        return True
+
+    def latest(self) -> Tuple[Optional[bytes], Optional[bytes], Optional[str]]:
+        """(body, gzipped body, etag) of the newest snapshot"""
+        with self._cond:
+            return self.body, self.gzip_body, self.etag
+
+    def events_since(self, version: int) -> List[Tuple[int, str, str]]:
+        """
+        SSE events (id, event name, data) that bring a client at `version` up
+        to date: the deltas it missed, or one full snapshot if it is new or
+        too far behind.
+        """
+        with self._cond:
+            if self.body is None or version == self.version:
+                return []
+            oldest = self._deltas[0][0] if self._deltas else self.version + 1
+            if 0 < version and version + 1 >= oldest and version < self.version:
+                return [(v, 'delta', data) for v, data in self._deltas if v > version]
+            return [(self.version, 'snapshot', self.body.decode())]
+
+    def wait_for_change(self, version: int, timeout: float) -> bool:
+        """
+        Wait until there is something newer than `version`. Before the first
+        snapshot there is nothing to send, whatever the version: a client
+        resuming with an id from before a server restart waits too.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.body is not None and self.version != version, timeout)
+
+
+snapshot_hub = SnapshotHub()
+
+
+def watch_snapshots(hub: SnapshotHub, db_path: str = DB_PATH, directory: str = '.',
+                    interval: float = WATCH_SECONDS, stop: Optional[threading.Event] = None):
+    """
+    Publish every new snapshot to the hub. Uses the collector's SQLite store
+    when it exists, otherwise the newest transit_locations_*.json file (the
+    directory is only listed again when its modification time changes).
+    """
+    from location_store import LocationStore
+
+    stop = stop or threading.Event()
+    store = None
+    last_id = None
+    last_mtime = None
+    while not stop.is_set():
+        try:
+            if store is None and os.path.exists(db_path):
+                store = LocationStore(db_path)
+            if store is not None:
+                snapshot_id = store.latest_snapshot_id()
+                if snapshot_id != last_id:
+                    last_id = snapshot_id
+                    snapshot = store.latest_snapshot()
+                    if snapshot:
+                        hub.publish(snapshot)
+            else:
+                mtime = os.stat(directory).st_mtime
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    newest = max(Path(directory).glob('transit_locations_*.json'), default=None)
+                    if newest:
+                        with open(newest) as f:
+                            hub.publish(json.load(f))
+        except Exception as e:
+            print(f"✗ Error loading snapshot: {e}")
+        stop.wait(interval)
+
 
 class TransitHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    hub = snapshot_hub
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=os.getcwd(), **kwargs)
-    
+
     def end_headers(self):
         # Add CORS headers for local development
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -22,29 +161,135 @@ class TransitHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         super().end_headers()
 
-def start_server():
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/latest':
+            self.send_latest()
+        elif url.path == '/api/events':
+            self.send_events(parse_qs(url.query))
+        else:
+            super().do_GET()
+
+    def send_latest(self):
+        body, gzip_body, etag = self.hub.latest()
+        if body is None:
+            # JSON rather than send_error's HTML, so map.html can tell "no
+            # data yet" from a plain file server without /api/latest
+            payload = json.dumps({'error': 'No snapshot yet'}).encode()
+            self.send_response(404)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        payload = gzip_body if use_gzip else body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_events(self, query: Dict[str, List[str]]):
+        last_id = self.headers.get('Last-Event-ID') or query.get('since', ['0'])[0]
+        try:
+            version = int(last_id)
+        except ValueError:
+            version = 0
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while True:
+                events = self.hub.events_since(version)
+                if events:
+                    self.wfile.write(''.join(f"id: {v}\nevent: {name}\ndata: {data}\n\n"
+                                             for v, name, data in events).encode())
+                    version = events[-1][0]
+                elif not self.hub.wait_for_change(version, KEEPALIVE_SECONDS):
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away
+
+
+class TransitHTTPServer(http.server.ThreadingHTTPServer):
+    """One thread per connection, so open /api/events streams don't block requests"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_server(port: int = PORT, db_path: str = DB_PATH, collect: bool = False,
+                 interval: float = 30, open_browser: bool = True, replay: Optional[str] = None,
+                 speed: float = 60):
     """Start the HTTP server"""
-    with socketserver.TCPServer(("", PORT), TransitHTTPRequestHandler) as httpd:
-        print(f"🌐 Starting transit map server on port {PORT}")
-        print(f"📍 Map URL: http://localhost:{PORT}/map.html")
+    if collect or replay:
+        # Poll in-process and publish each snapshot the moment it is stored
+        from collector import Collector
+        from location_store import LocationStore
+        from location_tracker import LocationTracker
+        from replay import replay_location_tracker
+
+        store = LocationStore(':memory:' if replay else db_path)
+        if replay:
+            tracker = replay_location_tracker(replay, speed)
+        else:
+            tracker = LocationTracker(os.getenv('CALTRAIN_API_KEY'))
+        collector = Collector(tracker, store, interval)
+        collector.listeners.append(lambda snapshot_id: snapshot_hub.publish(store.latest_snapshot()))
+        threading.Thread(target=collector.run, daemon=True).start()
+    else:
+        threading.Thread(target=watch_snapshots, args=(snapshot_hub, db_path), daemon=True).start()
+
+    with TransitHTTPServer(("", port), TransitHTTPRequestHandler) as httpd:
+        print(f"🌐 Starting transit map server on port {port}")
+        print(f"📍 Map URL: http://localhost:{port}/map.html")
         print(f"🗂️  Serving files from: {os.getcwd()}")
-        print(f"📊 Data files available:")
-        
-        # List available data files
-        data_files = sorted(Path('.').glob('transit_locations_*.json'))
-        for file in data_files:
-            print(f"   - {file.name}")
-        
-        print(f"\n🚀 Opening map in browser...")
-        webbrowser.open(f'http://localhost:{PORT}/map.html')
-        
+        print(f"📡 Latest snapshot: http://localhost:{port}/api/latest (live updates at /api/events)")
+        if replay:
+            print(f"⏩ Replaying the feeds recorded in {replay} at {speed:g}x")
+        else:
+            print(f"📊 Snapshots from: {db_path if collect or os.path.exists(db_path) else 'transit_locations_*.json files'}")
+
+        if open_browser:
+            print(f"\n🚀 Opening map in browser...")
+            webbrowser.open(f'http://localhost:{port}/map.html')
+
         print(f"💡 Press Ctrl+C to stop the server")
-        print(f"🔄 Refresh the page to load new data after running location_tracker.py")
-        
+        print(f"🔄 The map updates itself whenever the collector stores new data")
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print(f"\n🛑 Server stopped")
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the transit map")
+    parser.add_argument('--port', type=int, default=PORT, help="port (default: %(default)s)")
+    parser.add_argument('--db', default=DB_PATH, help="collector database (default: %(default)s)")
+    parser.add_argument('--collect', action='store_true', help="also run the collector in this process")
+    parser.add_argument('--interval', type=float, default=30, help="poll interval with --collect (default: 30)")
+    parser.add_argument('--no-browser', action='store_true', help="don't open the map in a browser")
+    parser.add_argument('--replay', metavar='DIR', help="collect from the feeds recorded in DIR, without network access; "
+                        "snapshots are kept in memory")
+    parser.add_argument('--speed', type=float, default=60, help="with --replay, playback speed (default: 60)")
+    args = parser.parse_args()
+    start_server(args.port, args.db, args.collect, args.interval, not args.no_browser,
+                 args.replay, args.speed)
+
+
 if __name__ == "__main__":
-    start_server()
+    main()
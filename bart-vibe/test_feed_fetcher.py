@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Feed Fetcher module
+"""
+
+import time
+
+import pytest
+import requests
+
+# Import the module under test
+from feed_fetcher import FeedFetcher
+
+FEED_URL = "http://api.bart.gov/gtfsrt/tripupdate.aspx"
+CALTRAIN_URL = "https://api.511.org/transit/VehiclePositions"
+
+
+class TestFeedFetcher:
+    """Test the FeedFetcher class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.fetcher = FeedFetcher(headers={'User-Agent': 'test'})
+
+    def teardown_method(self):
+        self.fetcher.close()
+
+    def test_get_returns_content(self, requests_mock):
+        """Test a plain GET returns the body and sends the session headers"""
+        requests_mock.get(FEED_URL, content=b'feed')
+
+        response = self.fetcher.get(FEED_URL)
+
+        assert response.content == b'feed'
+        assert response.status_code == 200
+        assert not response.not_modified
+        assert requests_mock.last_request.headers['User-Agent'] == 'test'
+
+    def test_http_error_raises(self, requests_mock):
+        """Test HTTP errors are raised like raise_for_status()"""
+        requests_mock.get(FEED_URL, status_code=500)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            self.fetcher.get(FEED_URL)
+
+    def test_conditional_get_reuses_cached_body(self, requests_mock):
+        """Test ETag/Last-Modified are sent back and a 304 reuses the last body"""
+        requests_mock.get(FEED_URL, [
+            {'content': b'feed v1', 'headers': {'ETag': '"v1"', 'Last-Modified': 'Tue, 09 Sep 2025 19:00:00 GMT'}},
+            {'status_code': 304},
+        ])
+
+        first = self.fetcher.get(FEED_URL)
+        second = self.fetcher.get(FEED_URL)
+
+        assert first.content == b'feed v1'
+        assert second.content == b'feed v1'
+        assert second.not_modified
+        assert requests_mock.last_request.headers['If-None-Match'] == '"v1"'
+        assert requests_mock.last_request.headers['If-Modified-Since'] == 'Tue, 09 Sep 2025 19:00:00 GMT'
+
+    def test_no_validators_means_unconditional_get(self, requests_mock):
+        """Test responses without ETag/Last-Modified are not cached"""
+        requests_mock.get(FEED_URL, content=b'feed')
+
+        self.fetcher.get(FEED_URL)
+        self.fetcher.get(FEED_URL)
+
+        assert 'If-None-Match' not in requests_mock.last_request.headers
+
+    def test_get_first_remembers_working_params(self, requests_mock):
+        """Test the parameter set that worked is tried first next time"""
+        requests_mock.get(CALTRAIN_URL, status_code=400)
+        requests_mock.get(CALTRAIN_URL + '?operator_id=CT', content=b'ok')
+        params_list = [{'agency': 'CT'}, {'operator_id': 'CT'}, {}]
+
+        result, index = self.fetcher.get_first('caltrain', CALTRAIN_URL, params_list, bytes.decode)
+        assert (result, index) == ('ok', 1)
+        assert requests_mock.call_count == 2
+
+        result, index = self.fetcher.get_first('caltrain', CALTRAIN_URL, params_list, bytes.decode)
+        assert (result, index) == ('ok', 1)
+        assert requests_mock.call_count == 3  # straight to the known set
+
+    def test_get_first_skips_unparseable_bodies(self, requests_mock):
+        """Test a body the parser rejects counts as a failed parameter set"""
+        requests_mock.get(CALTRAIN_URL + '?agency=CT', content=b'not a feed')
+        requests_mock.get(CALTRAIN_URL + '?operator_id=CT', content=b'42')
+
+        result, index = self.fetcher.get_first('caltrain', CALTRAIN_URL,
+                                               [{'agency': 'CT'}, {'operator_id': 'CT'}], int)
+
+        assert (result, index) == (42, 1)
+
+    def test_get_first_raises_when_nothing_works(self, requests_mock):
+        """Test the last error is raised when every parameter set fails"""
+        requests_mock.get(CALTRAIN_URL, status_code=401)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            self.fetcher.get_first('caltrain', CALTRAIN_URL, [{'a': '1'}, {'b': '2'}], bytes.decode)
+
+    def test_run_concurrently_overlaps_jobs(self):
+        """Test jobs run at the same time, so total time is the slowest job"""
+        def slow(value):
+            def job():
+                time.sleep(0.2)
+                return value
+            return job
+
+        start = time.perf_counter()
+        results = self.fetcher.run_concurrently({'a': slow(1), 'b': slow(2), 'c': slow(3)})
+        elapsed = time.perf_counter() - start
+
+        assert results == {'a': 1, 'b': 2, 'c': 3}
+        assert elapsed < 0.5
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the GTFS-RT decoding module
+"""
+
+import json
+
+import pytest
+from google.transit import gtfs_realtime_pb2
+
+# Import the module under test
+from gtfs_decode import (StationIndex, StopUpdate, TripRecord, decode_trip_updates,
+                         encode_trip_updates, load_saved_trips, parse_feed, station_code)
+from location_tracker import LocationTracker
+
+
+def build_feed():
+    """A small trip updates feed like the BART API returns"""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = 1757471600
+
+    entity = feed.entity.add()
+    entity.id = '1771615'
+    entity.trip_update.trip.trip_id = '1771615'
+    entity.trip_update.vehicle.label = '3-door'
+    for i, stop_id in enumerate(['S40-1', 'S30-1', 'S20-1', 'S10-1']):
+        stop_update = entity.trip_update.stop_time_update.add()
+        stop_update.stop_id = stop_id
+        stop_update.arrival.delay = 232
+        stop_update.arrival.time = 1757471629 + 120 * i
+
+    # trip without stops or vehicle
+    entity = feed.entity.add()
+    entity.id = '1771616'
+    entity.trip_update.trip.trip_id = '1771616'
+    entity.trip_update.trip.route_id = '05'
+
+    # entities that aren't trip updates are skipped
+    entity = feed.entity.add()
+    entity.id = 'alert'
+    entity.alert.header_text.translation.add().text = 'Delays'
+    return feed
+
+
+class TestDecodeTripUpdates:
+    """Test decoding trip_update entities into TripRecords"""
+
+    def test_decode_fields(self):
+        """Test the kept fields and Unknown defaults"""
+        records = decode_trip_updates(build_feed())
+
+        assert len(records) == 2
+        first, second = records
+        assert (first.trip_id, first.route_id, first.vehicle_id) == ('1771615', 'Unknown', '3-door')
+        assert first.stop_count == 4
+        assert len(first.stops) == 3
+        assert first.stops[0] == StopUpdate('S40-1', 232, 1757471629, None, None)
+        assert (second.route_id, second.vehicle_id, second.stop_count, second.stops) == ('05', 'Unknown', 0, ())
+
+    def test_max_stops(self):
+        """Test only the first max_stops stop updates are decoded"""
+        records = decode_trip_updates(build_feed(), max_stops=1)
+        assert [stop.stop_id for stop in records[0].stops] == ['S40-1']
+        assert records[0].stop_count == 4
+
+    def test_to_train_info(self):
+        """Test records convert to the dicts fetch_bart_data reports"""
+        info = decode_trip_updates(build_feed())[0].to_train_info()
+
+        assert info['entity_id'] == '1771615'
+        assert info['stop_updates_count'] == 4
+        assert info['stop_updates'][0] == {
+            'stop_id': 'S40-1',
+            'arrival_delay': 232,
+            'arrival_time': 1757471629,
+            'departure_delay': None,
+            'departure_time': None
+        }
+
+    def test_round_trip_through_protobuf(self):
+        """Test encode_trip_updates produces a feed that decodes to the same records"""
+        records = decode_trip_updates(build_feed())
+        decoded = decode_trip_updates(parse_feed(encode_trip_updates(records, 1757471600)))
+
+        assert [r.to_train_info() for r in decoded] == [
+            dict(r.to_train_info(), stop_updates_count=len(r.stops)) for r in records
+        ]
+
+
+class TestStationIndex:
+    """Test the precomputed station lookup"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.index = StationIndex(LocationTracker().bart_station_coords)
+
+    def test_station_code(self):
+        """Test direction suffixes are removed"""
+        assert station_code('A10-1') == 'A10'
+        assert station_code('A10') == 'A10'
+
+    def test_lookup(self):
+        """Test stop_ids map to the station's coordinates and name"""
+        station = self.index.lookup('S10-2')
+
+        assert self.index.names[station] == 'Embarcadero'
+        assert self.index.lat[station] == pytest.approx(37.7927)
+        assert self.index.lon[station] == pytest.approx(-122.3967)
+        assert self.index.lookup('S10-1') == station
+
+    def test_unknown_stop(self):
+        """Test unknown stations give -1 and are remembered too"""
+        assert self.index.lookup('ZZZ-1') == -1
+        assert self.index._by_stop_id['ZZZ-1'] == -1
+
+
+class TestSavedTrips:
+    """Test replaying files written by TransitTracker.save_data"""
+
+    def test_load_saved_trips(self, tmp_path):
+        """Test a saved bart_trips file decodes to the same records as the live feed"""
+        records = decode_trip_updates(build_feed())
+        filename = tmp_path / 'bart_trips_20250909_192701.json'
+        with open(filename, 'w') as f:
+            json.dump({
+                'timestamp': '2025-09-09T19:27:01',
+                'trip_updates': {'feed_timestamp': 1757471600, 'entities_count': 3},
+                'alerts': None,
+                'trains': [r.to_train_info() for r in records],
+                'error': None
+            }, f)
+
+        header, loaded = load_saved_trips(str(filename))
+
+        assert header['feed_timestamp'] == 1757471600
+        assert all(isinstance(r, TripRecord) for r in loaded)
+        assert [r.to_train_info() for r in loaded] == [r.to_train_info() for r in records]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Location Store and Collector
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Import the modules under test
+from location_store import SCHEMA, LocationStore, import_json_files, to_epoch
+from collector import Collector
+
+
+def bart(vehicle_id, lat, lon, station='Embarcadero'):
+    return {
+        'system': 'BART',
+        'vehicle_id': vehicle_id,
+        'latitude': lat,
+        'longitude': lon,
+        'station': station,
+        'delay_seconds': 0,
+        'gps_source': 'estimated_from_station'
+    }
+
+
+def caltrain(vehicle_id, lat, lon):
+    return {
+        'system': 'Caltrain',
+        'vehicle_id': vehicle_id,
+        'latitude': lat,
+        'longitude': lon,
+        'speed_mps': 20.0,
+        'bearing': 180.0
+    }
+
+
+class TestLocationStore:
+    """Test the LocationStore class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.store = LocationStore(':memory:')
+        self.store.append_snapshot([bart('1234', 37.79, -122.39), caltrain('501', 37.50, -122.27)], 1000)
+        self.store.append_snapshot([bart('1234', 37.78, -122.40), caltrain('501', 37.52, -122.28)], 1030)
+        self.store.append_snapshot([bart('5678', 37.70, -122.46)], 1060)
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_vehicle_track(self):
+        """Test a vehicle's positions between two times, oldest first"""
+        track = self.store.vehicle_track('1234', 1000, 1030)
+
+        assert [p['timestamp'] for p in track] == [1000, 1030]
+        assert [p['latitude'] for p in track] == [37.79, 37.78]
+        assert track[0]['station'] == 'Embarcadero'
+
+    def test_vehicle_track_excludes_outside_range(self):
+        """Test positions outside [start, end] are left out"""
+        assert len(self.store.vehicle_track('501', 1001, 2000)) == 1
+        assert self.store.vehicle_track('1234', 1060, 2000) == []
+
+    def test_vehicles_at_uses_latest_snapshot_before(self):
+        """Test vehicles_at returns the snapshot in effect at that time"""
+        at_1045 = self.store.vehicles_at(1045)
+
+        assert {p['vehicle_id'] for p in at_1045} == {'1234', '501'}
+        assert all(p['timestamp'] == 1030 for p in at_1045)
+        assert self.store.vehicles_at(999) == []
+
+    def test_latest_snapshot_matches_save_locations_format(self):
+        """Test the latest snapshot looks like a transit_locations_*.json file"""
+        latest = self.store.latest_snapshot()
+
+        assert latest['total_vehicles'] == 1
+        assert latest['bart_count'] == 1
+        assert latest['caltrain_count'] == 0
+        assert latest['locations'] == [bart('5678', 37.70, -122.46)]
+        assert latest['timestamp'] == datetime.fromtimestamp(1060).isoformat()
+
+    def test_latest_snapshot_empty_store(self):
+        """Test an empty store has no latest snapshot"""
+        store = LocationStore(':memory:')
+        assert store.latest_snapshot() is None
+        assert store.latest_snapshot_id() is None
+        store.close()
+
+    def test_latest_snapshot_id_after_older_import(self):
+        """Test an older snapshot stored later doesn't become the latest one"""
+        newest = self.store.latest_snapshot_id()
+        self.store.append_snapshot([bart('0001', 37.60, -122.40)], 900)
+
+        assert self.store.latest_snapshot_id() == newest
+        assert self.store.latest_snapshot()['locations'] == [bart('5678', 37.70, -122.46)]
+
+    def test_datetime_arguments(self):
+        """Test queries accept datetimes and ISO strings as well as epoch seconds"""
+        start = datetime.fromtimestamp(1000)
+        assert to_epoch(start) == 1000
+        assert to_epoch(start.isoformat()) == 1000
+        assert len(self.store.vehicle_track('1234', start, start.isoformat())) == 1
+
+    def test_snapshot_times(self):
+        """Test listing snapshot timestamps"""
+        assert self.store.snapshot_times() == [1000, 1030, 1060]
+        assert self.store.snapshot_times(1010, 1060) == [1030, 1060]
+
+    def test_import_json_files(self, tmp_path):
+        """Test importing files written by LocationTracker.save_locations"""
+        filename = tmp_path / 'transit_locations_20250909_120000.json'
+        with open(filename, 'w') as f:
+            json.dump({
+                'timestamp': '2025-09-09T12:00:00',
+                'total_vehicles': 1,
+                'bart_count': 1,
+                'caltrain_count': 0,
+                'locations': [bart('9999', 37.80, -122.27)]
+            }, f)
+
+        store = LocationStore(str(tmp_path / 'test.db'))
+        assert import_json_files(store, [str(filename)]) == 1
+        assert store.vehicles_at('2025-09-09T12:00:05')[0]['vehicle_id'] == '9999'
+        store.close()
+
+    def test_path_round_trip(self):
+        """Test a BART train's path keyframes are stored and read back as lists"""
+        location = dict(bart('4321', 37.79, -122.39), path=[[1100, 37.79, -122.39], [1190, 37.78, -122.40]])
+        self.store.append_snapshot([location], 1100)
+
+        assert self.store.latest_snapshot()['locations'] == [location]
+
+    def test_adds_missing_columns(self, tmp_path):
+        """Test a database from before a column existed gets it added"""
+        path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA.replace(',\n    path TEXT', ''))
+        conn.close()
+
+        store = LocationStore(path)
+        store.append_snapshot([dict(bart('4321', 37.79, -122.39), path=[[1100, 37.79, -122.39]])], 1100)
+        assert store.latest_snapshot()['locations'][0]['path'] == [[1100, 37.79, -122.39]]
+        store.close()
+
+    def test_persists_across_reopen(self, tmp_path):
+        """Test snapshots are still there after reopening the database"""
+        path = str(tmp_path / 'test.db')
+        store = LocationStore(path)
+        store.append_snapshot([bart('1234', 37.79, -122.39)], 1000)
+        store.close()
+
+        store = LocationStore(path)
+        assert store.snapshot_times() == [1000]
+        store.close()
+
+
+class TestCollector:
+    """Test the Collector class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.store = LocationStore(':memory:')
+        self.tracker = Mock()
+        self.tracker.get_all_locations.return_value = {
+            'bart': [bart('1234', 37.79, -122.39)],
+            'caltrain': [caltrain('501', 37.50, -122.27)]
+        }
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_poll_once_stores_snapshot(self):
+        """Test one poll appends one snapshot and notifies listeners"""
+        collector = Collector(self.tracker, self.store)
+        notified = []
+        collector.listeners.append(notified.append)
+
+        with patch('builtins.print'):
+            snapshot_id = collector.poll_once()
+
+        assert notified == [snapshot_id]
+        assert self.store.latest_snapshot()['total_vehicles'] == 2
+        self.tracker.save_locations.assert_not_called()
+
+    def test_poll_once_nothing_found(self):
+        """Test an empty poll stores nothing"""
+        self.tracker.get_all_locations.return_value = {'bart': [], 'caltrain': []}
+        collector = Collector(self.tracker, self.store)
+
+        with patch('builtins.print'):
+            assert collector.poll_once() is None
+        assert self.store.latest_snapshot() is None
+
+    def test_write_json_option(self):
+        """Test --write-json still produces the old per-poll files"""
+        collector = Collector(self.tracker, self.store, write_json=True)
+
+        with patch('builtins.print'):
+            collector.poll_once()
+
+        self.tracker.save_locations.assert_called_once()
+
+    def test_run_survives_errors(self):
+        """Test a failed poll is reported and the schedule continues"""
+        self.tracker.get_all_locations.side_effect = [RuntimeError("boom"), self.tracker.get_all_locations.return_value]
+        collector = Collector(self.tracker, self.store, interval=0)
+
+        with patch('builtins.print'):
+            collector.run(max_polls=2)
+
+        assert len(self.store.snapshot_times()) == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
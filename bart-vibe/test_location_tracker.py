@@ -73,6 +73,9 @@ class TestLocationTracker:
             mock_stop_time_update.stop_id = "A10-1"
             mock_stop_time_update.HasField.return_value = True
             mock_stop_time_update.arrival.delay = 300
+            mock_stop_time_update.arrival.time = 1757471629
+            mock_stop_time_update.departure.delay = 300
+            mock_stop_time_update.departure.time = 1757471647
             
             mock_trip_update.stop_time_update = [mock_stop_time_update]
             mock_trip_update.trip.trip_id = "1234"
@@ -224,7 +227,7 @@ class TestLocationTracker:
             assert data['caltrain_count'] == 1
             assert 'timestamp' in data
     
-    def test_unknown_station_handling(self):
+    def test_unknown_station_handling(self, requests_mock):
         """Test handling of unknown BART station codes"""
         # Mock a trip update with unknown station
         with patch('location_tracker.gtfs_realtime_pb2.FeedMessage') as mock_feed:
@@ -240,18 +243,17 @@ class TestLocationTracker:
             mock_feed_instance.entity = [mock_entity]
             mock_feed.return_value = mock_feed_instance
             
-            with patch('requests.get') as mock_get:
-                mock_get.return_value.content = b'mock_data'
+            requests_mock.get(self.tracker.bart_trip_updates_url, content=b'mock_data')
+            
+            # Capture print output to check unknown station logging
+            with patch('builtins.print') as mock_print:
+                locations = self.tracker.get_bart_locations()
                 
-                # Capture print output to check unknown station logging
-                with patch('builtins.print') as mock_print:
-                    locations = self.tracker.get_bart_locations()
-                    
-                    # Should print unknown station warning
-                    mock_print.assert_called()
-                    print_calls = [str(call) for call in mock_print.call_args_list]
-                    unknown_call = any("Unknown station code: UNKNOWN" in call for call in print_calls)
-                    assert unknown_call
+                # Should print unknown station warning
+                mock_print.assert_called()
+                print_calls = [str(call) for call in mock_print.call_args_list]
+                unknown_call = any("Unknown station code: UNKNOWN" in call for call in print_calls)
+                assert unknown_call
 
 
 class TestDataValidation:
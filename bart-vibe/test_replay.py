@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the offline replay of recorded feeds
+"""
+
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+import requests
+from google.transit import gtfs_realtime_pb2
+
+# Import the module under test
+from replay import ReplayFetcher, encode_vehicle_positions, load_recording, replay_location_tracker
+from collector import Collector
+from gtfs_decode import StopUpdate, TripRecord
+from location_store import LocationStore
+from location_tracker import LocationTracker
+from transit_tracker import TransitTracker
+
+SHIFT = 7 * 3600  # recorded in Pacific daylight time
+
+
+def file_time(name):
+    return datetime.strptime(name, '%Y%m%d_%H%M%S').timestamp()
+
+
+def write_recording(directory):
+    """Two BART trip update files and one transit_locations file with Caltrain vehicles"""
+    for name, arrival in (('20250909_192534', 600), ('20250909_192701', 500)):
+        feed_timestamp = int(file_time(name)) + SHIFT
+        stops = (StopUpdate('S20-2', 60, feed_timestamp + arrival, 60, feed_timestamp + arrival + 20),
+                 StopUpdate('S10-2', 60, feed_timestamp + arrival + 120, 60, feed_timestamp + arrival + 140))
+        train = TripRecord('1771615', '1771615', 'Unknown', '3-door', 2, stops).to_train_info()
+        with open(directory / f'bart_trips_{name}.json', 'w') as f:
+            json.dump({'timestamp': name, 'trains': [train], 'error': None,
+                       'trip_updates': {'feed_timestamp': feed_timestamp, 'entities_count': 1}}, f)
+
+    with open(directory / 'transit_locations_20250909_193110.json', 'w') as f:
+        json.dump({
+            'timestamp': '2025-09-09T19:31:10',
+            'locations': [
+                {'system': 'BART', 'vehicle_id': '1771615', 'latitude': 37.79, 'longitude': -122.40},
+                {'system': 'Caltrain', 'vehicle_id': '154', 'latitude': 37.37, 'longitude': -121.99,
+                 'speed_mps': 20.0, 'bearing': None}
+            ]
+        }, f)
+
+    # failed recordings are skipped
+    with open(directory / 'caltrain_data_20250909_192701.json', 'w') as f:
+        json.dump({'trains': [], 'error': 'Caltrain API key not provided'}, f)
+
+
+class TestLoadRecording:
+    """Test turning recorded files into frames"""
+
+    def test_frames(self, tmp_path):
+        """Test frames are in time order and carry the newest body of every feed"""
+        write_recording(tmp_path)
+        frames = load_recording(str(tmp_path))
+
+        assert [sorted(frame.feeds) for frame in frames] == [
+            ['bart_trips'], ['bart_trips'], ['bart_trips', 'caltrain']]
+        assert frames[2].feeds['bart_trips'] is frames[1].feeds['bart_trips']
+
+    def test_time_zone_shift(self, tmp_path):
+        """Test frame times line up with the BART feed timestamps"""
+        write_recording(tmp_path)
+        frames = load_recording(str(tmp_path))
+
+        assert frames[0].time == file_time('20250909_192534') + SHIFT
+        assert frames[2].time - frames[0].time == 336
+
+    def test_empty_directory(self, tmp_path):
+        """Test there is nothing to replay without recordings"""
+        assert load_recording(str(tmp_path)) == []
+        with pytest.raises(ValueError):
+            ReplayFetcher([])
+
+    def test_encode_vehicle_positions(self):
+        """Test Caltrain locations survive the round trip through protobuf"""
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(encode_vehicle_positions([
+            {'vehicle_id': '154', 'latitude': 37.5, 'longitude': -122.25, 'speed_mps': 20.0, 'bearing': None}
+        ]))
+
+        locations = LocationTracker()._caltrain_locations_from_feed(feed)
+        assert locations == [{'system': 'Caltrain', 'vehicle_id': '154', 'latitude': 37.5,
+                              'longitude': -122.25, 'speed_mps': 20.0, 'bearing': None}]
+
+
+class TestReplayFetcher:
+    """Test playing frames back through the trackers"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.clock = [0.0]
+
+    def fetcher(self, tmp_path, **kwargs):
+        write_recording(tmp_path)
+        return ReplayFetcher(load_recording(str(tmp_path)), clock=lambda: self.clock[0], **kwargs)
+
+    def test_step_mode(self, tmp_path):
+        """Test speed=0 plays one frame per advance()"""
+        fetcher = self.fetcher(tmp_path, speed=0, loop=False)
+
+        assert fetcher.advance() and fetcher.advance()
+        assert not fetcher.advance()
+        assert fetcher.now() == fetcher.frames[2].time
+
+    def test_accelerated_playback(self, tmp_path):
+        """Test frames change at `speed` times the recorded pace and loop at the end"""
+        fetcher = self.fetcher(tmp_path, speed=60)
+
+        self.clock[0] = 1.0  # 60 recorded seconds
+        assert fetcher.frame() is fetcher.frames[0]
+        self.clock[0] = 2.0
+        assert fetcher.frame() is fetcher.frames[1]
+        self.clock[0] = 336 / 60 + 1.0  # past the end: back to the start
+        assert fetcher.now() == fetcher.frames[0].time + 60
+
+    def test_wall_time(self, tmp_path):
+        """Test recorded times map onto the wall clock at playback speed"""
+        fetcher = self.fetcher(tmp_path, speed=60)
+        self.clock[0] = 1.0
+
+        with patch('replay.time.time', return_value=1_800_000_000.0):
+            assert fetcher.wall_time(fetcher.now()) == 1_800_000_000.0
+            assert fetcher.wall_time(fetcher.now() + 120) == 1_800_000_002.0
+
+    def test_replayed_paths_use_wall_time(self, tmp_path):
+        """Test BART path keyframes are sent on the wall clock, not the recording's"""
+        write_recording(tmp_path)
+        tracker = replay_location_tracker(str(tmp_path), speed=60)
+
+        with patch('builtins.print'):
+            bart = tracker.get_all_locations()['bart']
+
+        # keyframes are minutes apart in the recording, seconds apart at 60x
+        now = datetime.now().timestamp()
+        assert all(abs(t - now) < 60 for t, _, _ in bart[0]['path'])
+
+    def test_location_tracker(self, tmp_path):
+        """Test LocationTracker finds the recorded trains without network access"""
+        fetcher = self.fetcher(tmp_path, speed=0)
+        tracker = LocationTracker(caltrain_api_key='replay', fetcher=fetcher)
+        tracker.train_positions.clock = fetcher.now
+
+        with patch('builtins.print'):
+            first = tracker.get_all_locations()
+            fetcher.advance()
+            fetcher.advance()
+            last = tracker.get_all_locations()
+
+        assert [loc['vehicle_id'] for loc in first['bart']] == ['1771615']
+        assert first['caltrain'] == []
+        assert [loc['vehicle_id'] for loc in last['caltrain']] == ['154']
+
+    def test_missing_feed_is_404(self, tmp_path):
+        """Test feeds that weren't recorded fail like an HTTP error"""
+        fetcher = self.fetcher(tmp_path, speed=0)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            fetcher.get('http://api.bart.gov/gtfsrt/vehiclepositions.aspx')
+
+        with patch('builtins.print'):
+            feeds = TransitTracker(caltrain_api_key='replay', fetcher=fetcher).fetch_all()
+        assert len(feeds['bart_data']['trains']) == 1
+        assert feeds['bart_vehicles']['error'] is not None
+
+    def test_collector(self, tmp_path):
+        """Test the collector stores replayed snapshots"""
+        write_recording(tmp_path)
+        store = LocationStore(':memory:')
+        collector = Collector(replay_location_tracker(str(tmp_path), speed=60), store)
+
+        with patch('builtins.print'):
+            assert collector.poll_once() is not None
+        assert store.latest_snapshot()['bart_count'] == 1
+        store.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
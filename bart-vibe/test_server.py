@@ -10,11 +10,12 @@ import json
 import threading
 import time
 import requests
+from collections import deque
 from unittest.mock import patch, Mock
 from pathlib import Path
 
 # Import the module under test
-from server import TransitHTTPRequestHandler, start_server
+from server import SnapshotHub, TransitHTTPRequestHandler, TransitHTTPServer, snapshot_delta, start_server
 
 
 class TestTransitHTTPRequestHandler:
@@ -49,7 +50,7 @@ class TestServerFunctions:
     
     def test_start_server_with_mock(self):
         """Test server startup with mocked components"""
-        with patch('server.socketserver.TCPServer') as mock_server:
+        with patch('server.TransitHTTPServer') as mock_server, patch('server.watch_snapshots'):
             with patch('server.webbrowser.open') as mock_browser:
                 with patch('server.Path.glob') as mock_glob:
                     with patch('builtins.print') as mock_print:
@@ -215,5 +216,177 @@ class TestServerIntegration:
                 server.server_close()
 
 
+
+def make_snapshot(timestamp, *locations):
+    return {
+        'timestamp': timestamp,
+        'total_vehicles': len(locations),
+        'bart_count': sum(1 for loc in locations if loc['system'] == 'BART'),
+        'caltrain_count': sum(1 for loc in locations if loc['system'] == 'Caltrain'),
+        'locations': list(locations)
+    }
+
+
+def bart(vehicle_id, lat, lon):
+    return {'system': 'BART', 'vehicle_id': vehicle_id, 'latitude': lat, 'longitude': lon}
+
+
+class TestSnapshotHub:
+    """Test the in-memory latest snapshot and delta history"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.hub = SnapshotHub()
+        self.hub.publish(make_snapshot('2025-09-09T12:00:00', bart('1', 37.1, -122.1), bart('2', 37.2, -122.2)))
+
+    def test_snapshot_delta(self):
+        """Test added, moved and removed vehicles are found"""
+        old = {'BART:1': bart('1', 37.1, -122.1), 'BART:2': bart('2', 37.2, -122.2)}
+        new = {'BART:1': bart('1', 37.15, -122.1), 'BART:3': bart('3', 37.3, -122.3)}
+
+        delta = snapshot_delta(old, new)
+
+        assert delta['added'] == [bart('3', 37.3, -122.3)]
+        assert delta['moved'] == [bart('1', 37.15, -122.1)]
+        assert delta['removed'] == ['BART:2']
+
+    def test_publish_unchanged_snapshot(self):
+        """Test publishing the same snapshot again does not bump the version"""
+        assert not self.hub.publish(make_snapshot('2025-09-09T12:00:00', bart('1', 37.1, -122.1), bart('2', 37.2, -122.2)))
+        assert self.hub.version == 1
+
+    def test_new_client_gets_full_snapshot(self):
+        """Test a client without a Last-Event-ID gets the whole snapshot"""
+        events = self.hub.events_since(0)
+
+        assert [(v, name) for v, name, _ in events] == [(1, 'snapshot')]
+        assert json.loads(events[0][2])['total_vehicles'] == 2
+
+    def test_connected_client_gets_deltas(self):
+        """Test a client that is up to date only gets what changed"""
+        self.hub.publish(make_snapshot('2025-09-09T12:00:30', bart('1', 37.15, -122.1)))
+
+        events = self.hub.events_since(1)
+
+        assert [(v, name) for v, name, _ in events] == [(2, 'delta')]
+        delta = json.loads(events[0][2])
+        assert delta['moved'] == [bart('1', 37.15, -122.1)]
+        assert delta['removed'] == ['BART:2']
+        assert delta['total_vehicles'] == 1
+        assert self.hub.events_since(2) == []
+
+    def test_client_too_far_behind_gets_snapshot(self):
+        """Test a client older than the delta history gets a full snapshot"""
+        hub = SnapshotHub()
+        hub._deltas = deque(maxlen=2)
+        for i in range(4):
+            hub.publish(make_snapshot(f'2025-09-09T12:00:0{i}', bart('1', 37.0 + i, -122.1)))
+
+        assert [name for _, name, _ in hub.events_since(1)] == ['snapshot']
+        assert [name for _, name, _ in hub.events_since(2)] == ['delta', 'delta']
+
+    def test_wait_for_change(self):
+        """Test waiting returns as soon as something is published"""
+        threading.Timer(0.1, self.hub.publish, [make_snapshot('later', bart('9', 37.9, -122.9))]).start()
+
+        start = time.time()
+        assert self.hub.wait_for_change(1, timeout=5)
+        assert time.time() - start < 2
+
+    def test_wait_for_first_snapshot(self):
+        """Test a stale version waits for the first snapshot instead of returning at once"""
+        hub = SnapshotHub()
+
+        assert hub.events_since(7) == []
+        assert not hub.wait_for_change(7, timeout=0.1)
+
+
+class TestSnapshotEndpoints:
+    """Integration tests for /api/latest and /api/events"""
+
+    def setup_method(self):
+        """Start a server with its own hub"""
+        self.hub = SnapshotHub()
+        self.hub.publish(make_snapshot('2025-09-09T12:00:00', bart('1', 37.1, -122.1)))
+        handler = type('Handler', (TransitHTTPRequestHandler,), {'hub': self.hub})
+        self.server = TransitHTTPServer(("", 0), handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_latest_gzip_and_etag(self):
+        """Test the latest snapshot is gzipped and revalidates with a 304"""
+        url = f'http://localhost:{self.port}/api/latest'
+        response = requests.get(url, timeout=5)
+
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.json()['locations'] == [bart('1', 37.1, -122.1)]
+
+        etag = response.headers['ETag']
+        response = requests.get(url, headers={'If-None-Match': etag}, timeout=5)
+        assert response.status_code == 304
+
+    def test_latest_without_data(self):
+        """Test a JSON 404 before the first snapshot arrives"""
+        self.hub.body = None
+        response = requests.get(f'http://localhost:{self.port}/api/latest', timeout=5)
+        assert response.status_code == 404
+        assert response.headers['Content-Type'] == 'application/json'
+        assert response.json() == {'error': 'No snapshot yet'}
+
+    def test_events_stream(self):
+        """Test the event stream sends the snapshot, then deltas as they are published"""
+        response = requests.get(f'http://localhost:{self.port}/api/events', stream=True, timeout=5)
+        lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+
+        assert next(lines) == 'id: 1'
+        assert next(lines) == 'event: snapshot'
+        assert json.loads(next(lines)[len('data: '):])['total_vehicles'] == 1
+
+        self.hub.publish(make_snapshot('2025-09-09T12:00:30', bart('1', 37.2, -122.1)))
+        assert next(lines) == ''
+        assert next(lines) == 'id: 2'
+        assert next(lines) == 'event: delta'
+        assert json.loads(next(lines)[len('data: '):])['moved'] == [bart('1', 37.2, -122.1)]
+        response.close()
+
+    def test_events_resume_with_last_event_id(self):
+        """Test a reconnecting client only gets what it missed"""
+        self.hub.publish(make_snapshot('2025-09-09T12:00:30', bart('1', 37.2, -122.1)))
+        response = requests.get(f'http://localhost:{self.port}/api/events',
+                                headers={'Last-Event-ID': '1'}, stream=True, timeout=5)
+        lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+
+        assert next(lines) == 'id: 2'
+        assert next(lines) == 'event: delta'
+        response.close()
+
+    def test_events_resume_before_first_snapshot(self):
+        """Test a client resuming after a server restart waits for the first snapshot"""
+        calls = []
+
+        class CountingHub(SnapshotHub):
+            def events_since(self, version):
+                calls.append(version)
+                return super().events_since(version)
+
+        hub = CountingHub()
+        self.server.RequestHandlerClass.hub = hub
+        response = requests.get(f'http://localhost:{self.port}/api/events',
+                                headers={'Last-Event-ID': '7'}, stream=True, timeout=5)
+        lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+        time.sleep(0.3)
+        assert len(calls) == 1  # not spinning
+
+        hub.publish(make_snapshot('2025-09-09T12:00:30', bart('1', 37.2, -122.1)))
+        assert next(lines) == 'id: 1'
+        assert next(lines) == 'event: snapshot'
+        response.close()
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the BART train position interpolation
+"""
+
+import pytest
+
+# Import the module under test
+from gtfs_decode import StationIndex, StopUpdate, TripRecord
+from location_tracker import LocationTracker
+from train_positions import TrackGeometry, TrainPositions, distance_m
+
+T = 1757471000
+
+
+def trip(trip_id, *stops):
+    """A TripRecord from (stop_id, arrival_time, departure_time) tuples"""
+    updates = tuple(StopUpdate(stop_id, 60, arrival, 60, departure) for stop_id, arrival, departure in stops)
+    return TripRecord(trip_id, trip_id, 'Unknown', 'Unknown', len(updates), updates)
+
+
+class TestTrackGeometry:
+    """Test the segment table learned from the feed"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.index = StationIndex(LocationTracker().bart_station_coords)
+        self.geometry = TrackGeometry(self.index)
+
+    def test_learn_segments(self):
+        """Test consecutive stop updates become segments with run times"""
+        self.geometry.learn([trip('1', ('S10-2', T, T + 20), ('S20-2', T + 110, T + 130), ('S30-2', T + 230, T + 250))])
+
+        segment = self.geometry.segment('S10-2', 'S20-2')
+        assert len(self.geometry) == 2
+        assert self.geometry.run_seconds[segment] == 90
+        assert self.geometry.length_m[segment] == pytest.approx(590, abs=20)
+        assert self.geometry.segment_into('S30-2') == self.geometry.segment('S20-2', 'S30-2')
+
+    def test_run_times_are_averaged(self):
+        """Test a segment seen again moves its run time towards the new one"""
+        self.geometry.observe('S10-2', 'S20-2', 100)
+        self.geometry.observe('S10-2', 'S20-2', 200)
+        assert self.geometry.run_seconds[0] == pytest.approx(120)
+
+    def test_unusable_segments(self):
+        """Test unknown stations, missing or implausible run times are ignored"""
+        assert self.geometry.observe('ZZZ-1', 'S20-2', 90) == -1
+        assert self.geometry.observe('S10-2', 'S20-2', None) == -1
+        assert self.geometry.observe('S10-2', 'S20-2', -5) == -1
+        assert self.geometry.observe('S10-2', 'S20-2', 4 * 3600) == -1
+        assert len(self.geometry) == 0
+
+
+class TestTrainPositions:
+    """Test the TrainPositions engine"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.index = StationIndex(LocationTracker().bart_station_coords)
+        self.positions = TrainPositions(self.index)
+        self.embarcadero = self.index.lookup('S10-2')
+        self.montgomery = self.index.lookup('S20-2')
+
+    def test_train_at_station_without_history(self):
+        """Test a train with no known previous stop is placed at its next station"""
+        self.positions.update([trip('1', ('S20-2', T + 100, T + 120))])
+        location = self.positions.locations(T)[0]
+
+        assert location['latitude'] == pytest.approx(self.index.lat[self.montgomery])
+        assert location['station'] == 'Montgomery'
+        assert location['gps_source'] == 'estimated_from_station'
+        assert location['delay_seconds'] == 60
+
+    def test_interpolates_between_polls(self):
+        """Test the departure seen in the last update places the train on the segment"""
+        self.positions.update([trip('1', ('S10-2', T, T + 20), ('S20-2', T + 120, T + 140))])
+        self.positions.update([trip('1', ('S20-2', T + 120, T + 140))])
+
+        positions = self.positions.positions_at(T + 70)
+        assert positions['moving'][0]
+        assert positions['latitude'][0] == pytest.approx(
+            (self.index.lat[self.embarcadero] + self.index.lat[self.montgomery]) / 2)
+        assert positions['speed_mps'][0] == pytest.approx(
+            distance_m(self.index.lat[self.embarcadero], self.index.lon[self.embarcadero],
+                       self.index.lat[self.montgomery], self.index.lon[self.montgomery]) / 100)
+
+    def test_first_sighting_uses_segment_run_time(self):
+        """Test a new train is placed using the learned run time into its next stop"""
+        self.positions.geometry.observe('S10-2', 'S20-2', 100)
+        self.positions.update([trip('1', ('S20-2', T + 100, T + 120))])
+
+        location = self.positions.locations(T + 25)[0]
+        assert location['gps_source'] == 'interpolated'
+        assert location['station'] == 'Montgomery'
+        assert 0 < location['bearing'] < 360
+        assert location['path'][0] == [T, round(self.index.lat[self.embarcadero], 6),
+                                        round(self.index.lon[self.embarcadero], 6)]
+
+    def test_dwell_and_end_of_path(self):
+        """Test trains wait at stations and stop at their last known one"""
+        self.positions.update([trip('1', ('S10-2', T, T + 20), ('S20-2', T + 120, T + 140))])
+
+        for when, station in ((T + 10, self.embarcadero), (T + 1000, self.montgomery)):
+            positions = self.positions.positions_at(when)
+            assert not positions['moving'][0]
+            assert positions['latitude'][0] == pytest.approx(self.index.lat[station])
+
+    def test_vectorized_over_trains(self):
+        """Test every train gets a row and trains with unknown stations are dropped"""
+        self.positions.update([
+            trip('1', ('S10-2', T, T + 20), ('S20-2', T + 120, T + 140)),
+            trip('2', ('S30-1', T + 50, T + 70)),
+            trip('3', ('ZZZ-1', T + 50, T + 70)),
+        ])
+
+        assert [r.trip_id for r in self.positions.records] == ['1', '2']
+        assert self.positions.times.shape == (2, 7)
+        assert len(self.positions.positions_at(T + 60)['latitude']) == 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Interpolated BART train positions
+
+BART publishes no GPS, only predicted arrival and departure times (with
+delays already applied) for each train's next stops. A train whose next
+stop is B and which left A at t0 is placed on the A-B segment in proportion
+to the time it has been travelling: (now - t0) / (arrival at B - t0).
+
+- TrackGeometry is the table of station-to-station segments (endpoints,
+  length, bearing and typical run time). It is learned from the feed itself:
+  consecutive stop updates of a trip are a segment, and the gap between the
+  departure from one and the arrival at the next is its run time. Segments
+  are straight lines between the station coordinates.
+- TrainPositions turns every train's stop times into keyframes
+  (time, station) - departure from the previous stop, then arrival and
+  departure at each of the next ones - held in NumPy arrays, one row per
+  train, so positions for all trains at any moment are one vectorized
+  interpolation. The previous stop comes from the train's last update, or,
+  for a train seen for the first time, from the segment table.
+
+Each location carries its remaining keyframes as 'path' ([time, lat, lon]
+triples), which map.html uses to keep trains moving between polls.
+"""
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gtfs_decode import StationIndex, StopUpdate, TripRecord
+
+EARTH_RADIUS_M = 6371000.0
+MAX_RUN_SECONDS = 30 * 60  # longer gaps between stops aren't a single segment
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters (works on scalars and arrays)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial compass bearing in degrees from point 1 to point 2"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def _event_times(stop: StopUpdate) -> Tuple[Optional[int], Optional[int]]:
+    """(arrival, departure) of a stop update, each falling back to the other"""
+    arrival = stop.arrival_time if stop.arrival_time is not None else stop.departure_time
+    departure = stop.departure_time if stop.departure_time is not None else arrival
+    return arrival, departure
+
+
+class TrackGeometry:
+    """Station-to-station segments seen in the feed"""
+
+    def __init__(self, station_index: StationIndex):
+        self.index = station_index
+        self.from_stop: List[str] = []
+        self.to_stop: List[str] = []
+        self.length_m: List[float] = []
+        self.bearing: List[float] = []
+        self.run_seconds: List[float] = []
+        self._segments: Dict[Tuple[str, str], int] = {}
+        self._into: Dict[str, int] = {}  # stop_id -> last segment seen ending there
+
+    def observe(self, from_stop: str, to_stop: str, run_seconds: Optional[float]) -> int:
+        """
+        Record one trip between two consecutive stops; returns the segment
+        number, or -1 if it isn't a usable segment. Run times are averaged.
+        """
+        start = self.index.lookup(from_stop)
+        end = self.index.lookup(to_stop)
+        if (start < 0 or end < 0 or start == end or run_seconds is None
+                or not 0 < run_seconds <= MAX_RUN_SECONDS):
+            return -1
+        segment = self._segments.get((from_stop, to_stop))
+        if segment is None:
+            lat, lon = self.index.lat, self.index.lon
+            segment = len(self.from_stop)
+            self._segments[(from_stop, to_stop)] = segment
+            self.from_stop.append(from_stop)
+            self.to_stop.append(to_stop)
+            self.length_m.append(float(distance_m(lat[start], lon[start], lat[end], lon[end])))
+            self.bearing.append(float(bearing_deg(lat[start], lon[start], lat[end], lon[end])))
+            self.run_seconds.append(float(run_seconds))
+        else:
+            self.run_seconds[segment] = 0.8 * self.run_seconds[segment] + 0.2 * run_seconds
+        self._into[to_stop] = segment
+        return segment
+
+    def learn(self, records: List[TripRecord]):
+        """Add the segments between consecutive stop updates of each trip"""
+        for record in records:
+            for stop, next_stop in zip(record.stops, record.stops[1:]):
+                departure = _event_times(stop)[1]
+                arrival = _event_times(next_stop)[0]
+                if departure is not None and arrival is not None:
+                    self.observe(stop.stop_id, next_stop.stop_id, arrival - departure)
+
+    def segment(self, from_stop: str, to_stop: str) -> int:
+        """The segment between two stops, or -1"""
+        return self._segments.get((from_stop, to_stop), -1)
+
+    def segment_into(self, stop_id: str) -> int:
+        """A known segment ending at stop_id, or -1"""
+        return self._into.get(stop_id, -1)
+
+    def __len__(self) -> int:
+        return len(self.from_stop)
+
+
+class TrainPositions:
+    """Positions of every BART train at any moment, from its stop times"""
+
+    def __init__(self, station_index: StationIndex, geometry: Optional[TrackGeometry] = None,
+                 max_stops: int = 3, clock: Callable[[], float] = time.time):
+        self.index = station_index
+        self.clock = clock  # epoch seconds "now" (a replay substitutes the recording's time)
+        # maps keyframe times onto the wall clock map.html animates against
+        # (a replay substitutes one; live keyframe times already are)
+        self.path_time: Optional[Callable[[float], float]] = None
+        self.geometry = geometry or TrackGeometry(station_index)
+        self.max_stops = max_stops
+        self.records: List[TripRecord] = []
+        # one row per train, 1 + 2 * max_stops keyframes, padded with the last one
+        width = 1 + 2 * max_stops
+        self.times = np.zeros((0, width))
+        self.stations = np.zeros((0, width), dtype=np.intp)
+        # trip_id -> (stop_id, departure time) of the stop the train last left
+        self._came_from: Dict[str, Tuple[str, Optional[int]]] = {}
+        self._last_stops: Dict[str, Tuple[StopUpdate, ...]] = {}
+        self._lat = np.asarray(station_index.lat)
+        self._lon = np.asarray(station_index.lon)
+
+    def update(self, records: List[TripRecord]):
+        """Replace the trains with the ones in a new feed"""
+        self.geometry.learn(records)
+        width = self.times.shape[1]
+        times, stations, kept = [], [], []
+        came_from = {}
+        for record in records:
+            keyframes = self._keyframes(record, came_from)
+            if not keyframes:
+                continue
+            keyframes += [keyframes[-1]] * (width - len(keyframes))
+            times.append([t for t, _ in keyframes])
+            stations.append([s for _, s in keyframes])
+            kept.append(record)
+
+        self._came_from = came_from
+        self._last_stops = {record.trip_id: record.stops for record in records}
+        self.records = kept
+        self.times = np.maximum.accumulate(np.array(times, dtype=float).reshape(-1, width), axis=1)
+        self.stations = np.array(stations, dtype=np.intp).reshape(-1, width)
+
+    def _keyframes(self, record: TripRecord, came_from: Dict) -> List[Tuple[float, int]]:
+        keyframes = []
+        for stop in record.stops[:self.max_stops]:
+            station = self.index.lookup(stop.stop_id)
+            arrival, departure = _event_times(stop)
+            if station < 0 or arrival is None:
+                break
+            keyframes += [(arrival, station), (departure, station)]
+        if not keyframes:
+            first = record.stops[0] if record.stops else None
+            station = self.index.lookup(first.stop_id) if first else -1
+            return [(0, station)] if station >= 0 else []
+
+        next_stop = record.stops[0]
+        previous = self._previous_stop(record.trip_id, next_stop)
+        if previous is not None:
+            came_from[record.trip_id] = previous
+            stop_id, departure = previous
+            if departure is None:
+                # only the segment is known: assume its usual run time
+                segment = self.geometry.segment(stop_id, next_stop.stop_id)
+                if segment >= 0:
+                    departure = keyframes[0][0] - self.geometry.run_seconds[segment]
+            station = self.index.lookup(stop_id)
+            if departure is not None and station >= 0:
+                keyframes.insert(0, (departure, station))
+        return keyframes
+
+    def _previous_stop(self, trip_id: str, next_stop: StopUpdate) -> Optional[Tuple[str, Optional[int]]]:
+        """(stop_id, departure time) of the stop a train left to head for next_stop"""
+        last_stops = self._last_stops.get(trip_id, ())
+        for earlier, later in zip(last_stops, last_stops[1:]):
+            if later.stop_id == next_stop.stop_id:
+                return earlier.stop_id, _event_times(earlier)[1]
+        previous = self._came_from.get(trip_id)
+        if previous is not None and last_stops and last_stops[0].stop_id == next_stop.stop_id:
+            return previous  # still on the same segment as last time
+        segment = self.geometry.segment_into(next_stop.stop_id)
+        if segment >= 0:
+            return self.geometry.from_stop[segment], None
+        return None
+
+    def positions_at(self, when: float) -> Dict[str, np.ndarray]:
+        """
+        Where every train is at `when` (epoch seconds), as arrays indexed like
+        self.records: latitude, longitude, station (the next station),
+        keyframe (index of the segment start), moving, bearing, speed_mps.
+        """
+        count, width = self.times.shape
+        rows = np.arange(count)
+        start = np.clip((self.times <= when).sum(axis=1) - 1, 0, width - 2)
+        end = start + 1
+        t0, t1 = self.times[rows, start], self.times[rows, end]
+        span = t1 - t0
+        fraction = np.clip(np.divide(when - t0, span, out=np.zeros(count), where=span > 0), 0, 1)
+
+        from_station, to_station = self.stations[rows, start], self.stations[rows, end]
+        lat0, lon0 = self._lat[from_station], self._lon[from_station]
+        lat1, lon1 = self._lat[to_station], self._lon[to_station]
+        moving = (from_station != to_station) & (fraction > 0) & (fraction < 1)
+        speed = np.divide(distance_m(lat0, lon0, lat1, lon1), span, out=np.zeros(count), where=moving)
+        return {
+            'latitude': lat0 + fraction * (lat1 - lat0),
+            'longitude': lon0 + fraction * (lon1 - lon0),
+            'station': np.where(fraction > 0, to_station, from_station),
+            'keyframe': start,
+            'moving': moving,
+            'bearing': bearing_deg(lat0, lon0, lat1, lon1),
+            'speed_mps': speed,
+        }
+
+    def locations(self, when: Optional[float] = None) -> List[Dict]:
+        """Location dicts (as LocationTracker reports them) for every train"""
+        when = self.clock() if when is None else when
+        positions = self.positions_at(when)
+        locations = []
+        for i, record in enumerate(self.records):
+            moving = bool(positions['moving'][i])
+            location = {
+                'system': 'BART',
+                'vehicle_id': record.trip_id,
+                'latitude': round(float(positions['latitude'][i]), 6),
+                'longitude': round(float(positions['longitude'][i]), 6),
+                'station': self.index.names[positions['station'][i]],
+                'delay_seconds': record.stops[0].arrival_delay or 0,
+                'gps_source': 'interpolated' if moving else 'estimated_from_station'
+            }
+            if moving:
+                location['speed_mps'] = round(float(positions['speed_mps'][i]), 1)
+                location['bearing'] = round(float(positions['bearing'][i]), 1)
+            path = self._path(i, positions['keyframe'][i])
+            if len(path) > 1:
+                location['path'] = path
+            locations.append(location)
+        return locations
+
+    def _path(self, row: int, start: int) -> List[List[float]]:
+        """The train's keyframes from `start` on, as [time, lat, lon]"""
+        path = []
+        for t, station in zip(self.times[row, start:], self.stations[row, start:]):
+            if self.path_time is not None:
+                t = self.path_time(t)
+            keyframe = [int(t), round(float(self._lat[station]), 6), round(float(self._lon[station]), 6)]
+            if not path or path[-1] != keyframe:
+                path.append(keyframe)
+        return path
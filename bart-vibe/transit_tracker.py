@@ -9,7 +9,6 @@ This program fetches real-time train locations from:
 Displays train information and saves data to files.
 """
 
-import requests
 import json
 import time
 import os
@@ -17,13 +16,17 @@ from datetime import datetime
 from typing import Dict, List, Optional
 from google.transit import gtfs_realtime_pb2
 
+from feed_fetcher import FeedFetcher
+from gtfs_decode import decode_trip_updates, station_code
+
 class TransitTracker:
-    def __init__(self, caltrain_api_key: Optional[str] = None):
+    def __init__(self, caltrain_api_key: Optional[str] = None, fetcher: Optional[FeedFetcher] = None):
         """
         Initialize the Transit Tracker
         
         Args:
             caltrain_api_key: API key for 511.org (required for Caltrain data)
+            fetcher: shared FeedFetcher (one with keep-alive connections is created if omitted)
         """
         # BART GTFS-RT URLs (no API key required)
         self.bart_trip_updates_url = "http://api.bart.gov/gtfsrt/tripupdate.aspx"
@@ -40,6 +43,7 @@ class TransitTracker:
         self.headers = {
             'User-Agent': 'Transit-Tracker/1.0 (Educational Project)'
         }
+        self.fetcher = fetcher or FeedFetcher(headers=self.headers)
         
         # Basic BART station mapping (partial list for common stations)
         self.bart_stations = {
@@ -67,9 +71,7 @@ class TransitTracker:
             return stop_id
         
         # Extract station code (remove direction suffix like -1, -2)
-        station_code = stop_id.split('-')[0] if '-' in stop_id else stop_id
-        
-        return self.bart_stations.get(station_code, stop_id)
+        return self.bart_stations.get(station_code(stop_id), stop_id)
 
     def fetch_bart_data(self) -> Dict:
         """Fetch BART real-time data"""
@@ -83,8 +85,7 @@ class TransitTracker:
         
         try:
             print("Fetching BART trip updates...")
-            response = requests.get(self.bart_trip_updates_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            response = self.fetcher.get(self.bart_trip_updates_url)
             
             # Parse GTFS-RT protobuf data
             feed = gtfs_realtime_pb2.FeedMessage()
@@ -95,44 +96,8 @@ class TransitTracker:
                 'entities_count': len(feed.entity)
             }
             
-            # Extract train information with more detailed parsing
-            for entity in feed.entity:
-                if entity.HasField('trip_update'):
-                    trip_update = entity.trip_update
-                    
-                    # Get basic trip info
-                    trip_id = trip_update.trip.trip_id if trip_update.trip.HasField('trip_id') else 'Unknown'
-                    route_id = trip_update.trip.route_id if trip_update.trip.HasField('route_id') else 'Unknown'
-                    
-                    # Check for vehicle info
-                    vehicle_id = 'Unknown'
-                    if trip_update.HasField('vehicle'):
-                        if trip_update.vehicle.HasField('id'):
-                            vehicle_id = trip_update.vehicle.id
-                        elif trip_update.vehicle.HasField('label'):
-                            vehicle_id = trip_update.vehicle.label
-                    
-                    # Get stop time updates with more details
-                    stop_updates = []
-                    for stop_update in trip_update.stop_time_update:
-                        stop_info = {
-                            'stop_id': stop_update.stop_id if stop_update.HasField('stop_id') else 'Unknown',
-                            'arrival_delay': stop_update.arrival.delay if stop_update.HasField('arrival') and stop_update.arrival.HasField('delay') else None,
-                            'arrival_time': stop_update.arrival.time if stop_update.HasField('arrival') and stop_update.arrival.HasField('time') else None,
-                            'departure_delay': stop_update.departure.delay if stop_update.HasField('departure') and stop_update.departure.HasField('delay') else None,
-                            'departure_time': stop_update.departure.time if stop_update.HasField('departure') and stop_update.departure.HasField('time') else None
-                        }
-                        stop_updates.append(stop_info)
-                    
-                    train_info = {
-                        'entity_id': entity.id,
-                        'trip_id': trip_id,
-                        'route_id': route_id,
-                        'vehicle_id': vehicle_id,
-                        'stop_updates_count': len(trip_update.stop_time_update),
-                        'stop_updates': stop_updates[:3]  # Show first 3 stops for brevity
-                    }
-                    bart_data['trains'].append(train_info)
+            # Extract train information (first 3 stops of each trip for brevity)
+            bart_data['trains'] = [record.to_train_info() for record in decode_trip_updates(feed, max_stops=3)]
             
             print(f"✓ Found {len(bart_data['trains'])} BART trains with trip updates")
             
@@ -153,8 +118,7 @@ class TransitTracker:
         
         try:
             print("Fetching BART vehicle positions...")
-            response = requests.get(self.bart_vehicle_positions_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            response = self.fetcher.get(self.bart_vehicle_positions_url)
             
             # Parse GTFS-RT protobuf data
             feed = gtfs_realtime_pb2.FeedMessage()
@@ -232,8 +196,7 @@ class TransitTracker:
                 'format': 'gtfs-rt'
             }
             
-            response = requests.get(self.caltrain_base_url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            response = self.fetcher.get(self.caltrain_base_url, params=params)
             
             # Parse GTFS-RT protobuf data
             feed = gtfs_realtime_pb2.FeedMessage()
@@ -267,6 +230,14 @@ class TransitTracker:
         
         return caltrain_data
 
+    def fetch_all(self) -> Dict[str, Dict]:
+        """Fetch all three feeds concurrently; returns them keyed like save_data's arguments"""
+        return self.fetcher.run_concurrently({
+            'bart_data': self.fetch_bart_data,
+            'bart_vehicles': self.fetch_bart_vehicle_positions,
+            'caltrain_data': self.fetch_caltrain_data,
+        })
+
     def display_results(self, bart_data: Dict, bart_vehicles: Dict, caltrain_data: Dict):
         """Display the fetched train data"""
         print("\n" + "="*70)
@@ -393,11 +364,12 @@ def main():
     
     tracker = TransitTracker(caltrain_api_key=caltrain_api_key)
     
-    # Fetch data
+    # Fetch data (all feeds at once)
     print("Fetching real-time transit data...\n")
-    bart_data = tracker.fetch_bart_data()
-    bart_vehicles = tracker.fetch_bart_vehicle_positions()
-    caltrain_data = tracker.fetch_caltrain_data()
+    feeds = tracker.fetch_all()
+    bart_data = feeds['bart_data']
+    bart_vehicles = feeds['bart_vehicles']
+    caltrain_data = feeds['caltrain_data']
     
     # Display results
     tracker.display_results(bart_data, bart_vehicles, caltrain_data)
@@ -0,0 +1,266 @@
+"""
+Compact storage for the twitter challenge.
+
+Instead of one Python object per tweet, tweets are kept as three int64
+column arrays (userid, timestamp, content id) plus an interned pool of
+distinct tweet texts. Tweet objects are only created when a tweet is read.
+
+Optionally the store is backed by an append-only log of three files:
+    <path>.tweets   fixed 24-byte records: userid, timestamp, content id
+    <path>.offsets  one int64 per pool entry: end offset into .content
+    <path>.content  UTF-8 texts of the content pool, back to back
+plus a snapshot of the intern table, rewritten on flush():
+    <path>.index    content ids covered, then the table's slots
+(integers are native-endian int64, as written by array("q")).
+On restart the files are memory-mapped: the columns are bulk-copied out of
+the mapping at C speed and texts are decoded lazily, so nothing is replayed.
+A crash can leave a partly written record at the end of a file; loading cuts
+every file back to the last complete tweet.
+
+Texts are interned through an open-addressing hash table of content ids
+(an int64 array), and candidates are compared against the mapped bytes, so
+no mapped text is kept as a Python string. Slots are chosen by CRC-32 of the
+UTF-8 text (hash() of bytes changes between processes), so the saved table
+is valid after a restart; only texts added since the last flush() are
+hashed again.
+"""
+
+import mmap
+import os
+import zlib
+from array import array
+from typing import BinaryIO, Iterator, List, Optional
+
+import numpy as np
+
+RECORD_BYTES = 24  # userid, timestamp, content id
+EMPTY = -1  # free slot in the intern table
+
+
+class Tweet:
+    __slots__ = ("userid", "content", "timestamp")
+
+    def __init__(self, userid: int, content: str, timestamp: int):
+        self.userid = userid
+        self.content = content
+        self.timestamp = timestamp
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Tweet):
+            return NotImplemented
+        return (self.userid, self.timestamp, self.content) == (
+            other.userid, other.timestamp, other.content)
+
+    def __hash__(self) -> int:
+        return hash((self.userid, self.timestamp, self.content))
+
+    def __repr__(self) -> str:
+        return f"Tweet(u={self.userid}, t={self.timestamp}, c={self.content!r})"
+
+
+def _column(values: np.ndarray) -> array:
+    """Copy an int64 column (possibly strided) into an array("q")."""
+    return array("q", np.ascontiguousarray(values).tobytes())
+
+
+def _map(filename: str) -> Optional[mmap.mmap]:
+    """Read-only mapping of a file, or None if it is missing or empty."""
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return None
+    with open(filename, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class TweetStore:
+    """Column-oriented tweet storage, indexed by tweet id (0, 1, 2, ...)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.userids = array("q")
+        self.timestamps = array("q")
+        self.content_ids = array("q")
+
+        # content pool: ids below _mapped_count live in the mapped .content
+        # file, the rest in _pool
+        self._pool: List[str] = []
+        self._table: Optional[array] = None  # content ids by hash, built on the first write
+        self._table_used = 0
+        self._indexed = 0  # content ids covered by the saved .index
+        self._blob: Optional[mmap.mmap] = None
+        self._offsets = array("q")
+        self._mapped_count = 0
+        self._end_offset = 0  # bytes written to .content so far
+        self._files: List[BinaryIO] = []
+
+        if path is not None:
+            self._load(path)
+            self._files = [open(path + ext, "ab") for ext in (".tweets", ".offsets", ".content")]
+
+    def _load(self, path: str) -> None:
+        offsets = _map(path + ".offsets")
+        if offsets is not None:
+            count = len(offsets) // 8
+            self._offsets = array("q", memoryview(offsets)[: count * 8].cast("q"))
+            offsets.close()
+            # an offset is only valid once its text is completely written
+            content_size = os.path.getsize(path + ".content") if os.path.exists(path + ".content") else 0
+            while self._offsets and self._offsets[-1] > content_size:
+                self._offsets.pop()
+            self._mapped_count = len(self._offsets)
+            self._end_offset = self._offsets[-1] if self._offsets else 0
+
+        records = _map(path + ".tweets")
+        if records is not None:
+            count = len(records) // RECORD_BYTES
+            cols = np.frombuffer(records, dtype=np.int64, count=count * 3).reshape(count, 3)
+            # drop tweets from the first one whose text didn't make it to disk
+            dangling = np.flatnonzero(cols[:, 2] >= self._mapped_count)
+            if dangling.size:
+                count = int(dangling[0])
+            self.userids, self.timestamps, self.content_ids = (
+                _column(cols[:count, c]) for c in range(3))
+            del cols, dangling  # release the mapping
+            records.close()
+
+        # cut the files back to whole records, so appends line up again
+        for ext, size in ((".tweets", len(self.userids) * RECORD_BYTES),
+                          (".offsets", self._mapped_count * 8),
+                          (".content", self._end_offset)):
+            if os.path.exists(path + ext) and os.path.getsize(path + ext) > size:
+                os.truncate(path + ext, size)
+        if self._end_offset:
+            self._blob = _map(path + ".content")
+
+    def __len__(self) -> int:
+        return len(self.userids)
+
+    def __getitem__(self, i: int) -> Tweet:
+        if i < 0:
+            i += len(self)
+        return Tweet(self.userids[i], self.content(self.content_ids[i]), self.timestamps[i])
+
+    def __iter__(self) -> Iterator[Tweet]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def content(self, content_id: int) -> str:
+        if content_id < self._mapped_count:
+            return self._mapped_bytes(content_id).decode("utf-8")
+        return self._pool[content_id - self._mapped_count]
+
+    def _mapped_bytes(self, content_id: int) -> bytes:
+        if self._blob is None:  # every mapped text is empty
+            return b""
+        start = self._offsets[content_id - 1] if content_id else 0
+        return self._blob[start : self._offsets[content_id]]
+
+    def _content_bytes(self, content_id: int) -> bytes:
+        if content_id < self._mapped_count:
+            return self._mapped_bytes(content_id)
+        return self._pool[content_id - self._mapped_count].encode("utf-8")
+
+    def _slot(self, data: bytes) -> int:
+        """Table slot holding data's content id, or the empty slot where it goes."""
+        mask = len(self._table) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            content_id = self._table[slot]
+            if content_id == EMPTY or self._content_bytes(content_id) == data:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _build_table(self, count: int, size: int = 16) -> None:
+        while size < 2 * count:
+            size *= 2
+        self._table = array("q", [EMPTY]) * size
+        self._table_used = 0
+        self._add_to_table(0, count)
+
+    def _add_to_table(self, start: int, count: int) -> None:
+        for content_id in range(start, count):
+            self._table[self._slot(self._content_bytes(content_id))] = content_id
+            self._table_used += 1
+
+    def _load_index(self, count: int) -> int:
+        """Load the saved table if it only holds ids below count; ids it covers."""
+        index = _map(self.path + ".index")
+        if index is None:
+            return 0
+        saved = array("q")
+        saved.frombytes(index)
+        index.close()
+        covered = saved[0] if saved else 0
+        size = len(saved) - 1
+        # a table for texts lost in a crash can't be repaired (no deletes in
+        # open addressing), and one that is too full must be rebuilt anyway
+        if not 0 < covered <= count or size & (size - 1) or 2 * count > size:
+            return 0
+        self._table = saved[1:]
+        self._table_used = covered
+        self._indexed = covered
+        return covered
+
+    def _save_index(self) -> None:
+        """Write the table to .index, replacing the old one in one step."""
+        count = self._mapped_count + len(self._pool)
+        if self._table is None or self._indexed == count:
+            return
+        tmp = self.path + ".index.tmp"
+        with open(tmp, "wb") as f:
+            f.write(array("q", [count]).tobytes())
+            f.write(self._table.tobytes())
+        os.replace(tmp, self.path + ".index")
+        self._indexed = count
+
+    def intern(self, content: str) -> int:
+        """Id of content in the pool, adding it if it is new."""
+        count = self._mapped_count + len(self._pool)
+        if self._table is None:
+            # the saved table, plus whatever was added after it was saved
+            covered = self._load_index(count) if self.path is not None else 0
+            if covered:
+                self._add_to_table(covered, count)
+            else:
+                self._build_table(count)
+        if 2 * (self._table_used + 1) > len(self._table):
+            self._build_table(count, 2 * len(self._table))
+        data = content.encode("utf-8")
+        slot = self._slot(data)
+        content_id = self._table[slot]
+        if content_id == EMPTY:
+            content_id = count
+            self._pool.append(content)
+            self._table[slot] = content_id
+            self._table_used += 1
+            if self._files:
+                self._files[2].write(data)
+                self._end_offset += len(data)
+                self._files[1].write(array("q", [self._end_offset]).tobytes())
+        return content_id
+
+    def append(self, userid: int, content: str, timestamp: int) -> int:
+        """Store a tweet and return its id."""
+        content_id = self.intern(content)
+        self.userids.append(userid)
+        self.timestamps.append(timestamp)
+        self.content_ids.append(content_id)
+        if self._files:
+            self._files[0].write(array("q", [userid, timestamp, content_id]).tobytes())
+        return len(self.userids) - 1
+
+    def flush(self) -> None:
+        # texts before their offsets before the tweets that use them, so a
+        # crash mid-flush loses whole tweets rather than leaving dangling ids
+        for f in reversed(self._files):
+            f.flush()
+        if self._files:
+            self._save_index()
+
+    def close(self) -> None:
+        self.flush()
+        for f in self._files:
+            f.close()
+        self._files = []
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
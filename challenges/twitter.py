@@ -4,21 +4,37 @@
 # You can follow either this spec, or the Leetcode one
 ###
 
-from typing import List, Dict
+import heapq
+from array import array
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from tweet_store import Tweet, TweetStore
 
 # Globals / storage
+# Tweets live in a compact column store (see tweet_store.py); Tweet objects
+# are only built when a tweet is read.
 G_timestamp = 0
-tweets: List["Tweet"] = []
-followers: Dict[int, set[int]] = {}
-user_tweets: Dict[int, List[int]] = {}
-
-class Tweet:
-    def __init__(self, userid: int, content: str, timestamp: int):
-        self.userid = userid
-        self.content = content
-        self.timestamp = timestamp
-    def __repr__(self) -> str:
-        return f"Tweet(u={self.userid}, t={self.timestamp}, c={self.content!r})"
+tweets = TweetStore()
+followers: Dict[int, set[int]] = {}  # myid -> ids I follow
+user_tweets: Dict[int, array] = {}  # userid -> array('q') of tweet ids
+
+# Optional fan-out-on-write cache.
+# When enabled, every tweet id is pushed into a bounded feed deque for each
+# follower of its author, so a timeline read is just the head of one deque.
+# Authors with at least CELEBRITY_THRESHOLD followers are not pushed (that
+# would be one write per follower); their tweets are pulled and merged in at
+# read time instead. Once a user is a celebrity they stay one, so their
+# tweets are never missing from either side.
+FANOUT_ENABLED = False
+FANOUT_CACHE_SIZE = 100
+CELEBRITY_THRESHOLD = 1000
+followed_by: Dict[int, set[int]] = {}  # userid -> ids following them
+feeds: Dict[int, Deque[int]] = {}  # userid -> newest-first tweet ids
+celebrities: set[int] = set()
 
 def _next_ts() -> int:
     global G_timestamp
@@ -27,41 +43,106 @@ def _next_ts() -> int:
 
 def follow(myid: int, to_follow_id: int) -> None:
     followers.setdefault(myid, set()).add(to_follow_id)
+    fans = followed_by.setdefault(to_follow_id, set())
+    fans.add(myid)
+    if len(fans) >= CELEBRITY_THRESHOLD:
+        celebrities.add(to_follow_id)
+    feeds.pop(myid, None)  # rebuilt on next read
 
 def unfollow(myid: int, to_unfollow_id: int) -> None:
     if myid in followers:
         followers[myid].discard(to_unfollow_id)
+    if to_unfollow_id in followed_by:
+        followed_by[to_unfollow_id].discard(myid)
+    feeds.pop(myid, None)
 
 def follow_list(myid: int) -> List[int]:
     return list(followers.get(myid, set()))
 
 def tweet(myid: int, content: str) -> int:
     ts = _next_ts()
-    tw = Tweet(myid, content, ts)
-    tweets.append(tw)
-    user_tweets.setdefault(myid, []).append(len(tweets) - 1)
-    return len(tweets) - 1
+    tweet_id = tweets.append(myid, content, ts)
+    user_tweets.setdefault(myid, array("q")).append(tweet_id)
+    if FANOUT_ENABLED and myid not in celebrities:
+        for uid in followed_by.get(myid, set()) | {myid}:
+            feed = feeds.get(uid)
+            if feed is not None:  # feeds not built yet are built on read
+                feed.appendleft(tweet_id)
+    return tweet_id
 
 def users_tweets(userid: int) -> List[Tweet]:
     idxs = user_tweets.get(userid, [])
     return [tweets[i] for i in idxs]
 
+def _merge_newest(sources: Iterable[Iterable[int]]) -> Iterator[int]:
+    """
+    k-way merge of newest-first tweet id streams using a heap.
+    Tweet ids grow with timestamps, so each user's list is already sorted and
+    we only look at as many tweets as we actually return.
+    Duplicates (a tweet both cached and pulled) come out adjacent; skip them.
+    """
+    last = None
+    for tweet_id in heapq.merge(*sources, reverse=True):
+        if tweet_id != last:
+            yield tweet_id
+            last = tweet_id
+
+def _pull_ids(users: Iterable[int]) -> Iterator[int]:
+    return _merge_newest(reversed(user_tweets.get(u, [])) for u in users)
+
+def _feed(myid: int) -> Deque[int]:
+    """Fan-out feed for myid (non-celebrity followees + self), built lazily."""
+    feed = feeds.get(myid)
+    if feed is None:
+        ids = followers.get(myid, set()) | {myid}
+        pushed = [u for u in ids if u not in celebrities]
+        feed = deque(islice(_pull_ids(pushed), FANOUT_CACHE_SIZE),
+                     maxlen=FANOUT_CACHE_SIZE)
+        feeds[myid] = feed
+    return feed
+
 def timeline(myid: int, limit: int = 10) -> List[Tweet]:
     ids = set(followers.get(myid, set()))
     ids.add(myid)  # include own tweets
-    pool: List[Tweet] = []
-    for u in ids:
-        pool.extend(users_tweets(u)[-limit:])
-    pool.sort(key=lambda t: t.timestamp, reverse=True)
-    return pool[:limit]
+    if FANOUT_ENABLED and limit <= FANOUT_CACHE_SIZE:
+        # hybrid: cached feed for ordinary users, pull for celebrities
+        pulled = [reversed(user_tweets.get(u, [])) for u in ids & celebrities]
+        merged = _merge_newest([_feed(myid)] + pulled)
+    else:
+        merged = _pull_ids(ids)
+    return [tweets[i] for i in islice(merged, limit)]
+
+def open_store(path: Optional[str] = None) -> None:
+    """
+    Switch to a TweetStore backed by the append-only log at path (or a fresh
+    in-memory store if path is None), rebuilding the per-user index from the
+    userid column instead of replaying tweet() calls.
+    """
+    global G_timestamp, tweets
+    tweets.close()
+    tweets = TweetStore(path)
+    user_tweets.clear()
+    # group tweet ids by user with one stable sort (ids stay in time order
+    # within each group), so the Python work is per user, not per tweet
+    if len(tweets):
+        userids = np.array(tweets.userids, dtype=np.int64)
+        order = np.argsort(userids, kind="stable")
+        starts = np.flatnonzero(np.diff(userids[order])) + 1
+        for userid, ids in zip(userids[order[np.r_[0, starts]]], np.split(order, starts)):
+            user_tweets[int(userid)] = array("q", ids.astype(np.int64).tobytes())
+    G_timestamp = tweets.timestamps[-1] if len(tweets) else 0
+    feeds.clear()
+
+def reset() -> None:
+    """Clear all storage (used by the tests)."""
+    open_store(None)
+    followers.clear()
+    followed_by.clear()
+    celebrities.clear()
 
 def test_timeline_basic():
     # reset globals (assumes the fixed implementation from earlier is in scope)
-    global G_timestamp, tweets, followers, user_tweets
-    G_timestamp = 0
-    tweets = []
-    followers = {}
-    user_tweets = {}
+    reset()
 
     # Users: 1, 2, 3
     follow(1, 2)
@@ -104,8 +185,119 @@ def test_timeline_basic():
     print("Timeline(1) top 3:", [(t.userid, t.timestamp, t.content) for t in tl1_top3])
     assert len(tl1_top3) == min(3, len([t20, t21, t30, t31, t10]))
 
+def test_timeline_fanout():
+    global FANOUT_ENABLED, CELEBRITY_THRESHOLD
+    reset()
+    FANOUT_ENABLED, CELEBRITY_THRESHOLD = True, 3
+    try:
+        # user 9 becomes a celebrity (3 followers); 2 stays ordinary
+        for u in (1, 2, 3):
+            follow(u, 9)
+        follow(1, 2)
+        for i in range(5):
+            tweet(9, f"celeb {i}")
+            tweet(2, f"u2 {i}")
+            tweet(1, f"u1 {i}")
+        tl = timeline(1, limit=8)
+        expected_pull = sorted(
+            (t for t in tweets if t.userid in (1, 2, 9)),
+            key=lambda t: t.timestamp, reverse=True)[:8]
+        print("Fan-out timeline(1):", [(t.userid, t.timestamp) for t in tl])
+        assert tl == expected_pull
+        assert 9 in celebrities and 9 not in feeds
+
+        # tweets after the feed is built are pushed into it
+        tweet(2, "u2 late")
+        assert timeline(1, limit=1)[0].content == "u2 late"
+        unfollow(1, 2)
+        assert 2 not in {t.userid for t in timeline(1, limit=20)}
+    finally:
+        FANOUT_ENABLED, CELEBRITY_THRESHOLD = False, 1000
+
+def test_store_reopen():
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tweets")
+        open_store(path)
+        follow(1, 2)
+        tweet(2, "hello")
+        tweet(1, "héllo again")
+        tweet(2, "hello")  # interned: stored once in the content pool
+        before = timeline(1, limit=10)
+        tweets.flush()
+
+        open_store(path)  # "restart": memory-map the log
+        assert len(tweets) == 3 and tweets.content_ids[0] == tweets.content_ids[2]
+        assert timeline(1, limit=10) == before
+        tweet(2, "after restart")
+        assert timeline(1, limit=1)[0].content == "after restart"
+        print("Reopened store:", timeline(1, limit=10))
+        reset()
+
+def test_store_torn_write():
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tweets")
+        open_store(path)
+        follow(1, 2)
+        tweet(2, "hello")
+        tweet(2, "world")
+        before = timeline(1, limit=10)
+        tweets.flush()
+
+        # crash mid-append: a text without its offset, half an offset, half a tweet
+        with open(path + ".content", "ab") as f:
+            f.write("lost".encode("utf-8"))
+        with open(path + ".offsets", "ab") as f:
+            f.write(b"\x01\x02\x03")
+        with open(path + ".tweets", "ab") as f:
+            f.write(b"\x00" * 10)
+
+        open_store(path)
+        assert len(tweets) == 2 and timeline(1, limit=10) == before
+        tweet(2, "hello")  # still interned after the reopen
+        tweet(2, "after crash")
+        assert tweets.content_ids[2] == tweets.content_ids[0]
+        tweets.flush()
+
+        open_store(path)  # the repaired log reads back cleanly
+        assert [t.content for t in timeline(1, limit=10)] == ["after crash", "hello", "world", "hello"]
+        reset()
+
+def test_store_index():
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tweets")
+        open_store(path)
+        for i in range(50):
+            tweet(i % 3, f"text {i % 20}")
+        tweets.flush()
+        assert os.path.exists(path + ".index")
+
+        open_store(path)  # the saved table is reused, not rebuilt
+        assert sorted(user_tweets) == [0, 1, 2]
+        assert list(user_tweets[1]) == list(range(1, 50, 3))
+        tweet(1, "text 7")  # loads the table: every text is already in it
+        assert tweets._indexed == 20 and tweets.content_ids[-1] == tweets.content_ids[7]
+        tweets.flush()
+
+        # texts lost after the table was saved: the table is rebuilt
+        os.truncate(path + ".offsets", 10 * 8)
+        open_store(path)
+        tweet(2, "text 3")
+        assert tweets._indexed == 0 and tweets.content_ids[-1] == tweets.content_ids[3]
+        assert len({tweets[0], tweets[0]}) == 1  # Tweets are hashable
+        reset()
+
 def main():
     test_timeline_basic()
+    test_timeline_fanout()
+    test_store_reopen()
+    test_store_torn_write()
+    test_store_index()
 
 if __name__ == "__main__":
   main()
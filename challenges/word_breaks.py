@@ -1,9 +1,16 @@
 import argparse
+import multiprocessing
+import os
+import re
+import string
+import sys
 import time
 from collections import deque
-from typing import Dict, List, Set, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import benchmark
+from word_segmenter import WordSegmenter, find_words_aho_corasick
 
 
 # find all words matching the beginning of s, put them in a work queue
@@ -262,11 +269,131 @@ def read_dictionary() -> List[str]:
     return words
 
 
+# Streaming mode: segment millions of strings (URLs, hashtags) in parallel.
+# Each worker process loads the dictionary once (in the pool initializer)
+# and keeps a bounded LRU cache of segmented letter runs, so frequent pieces
+# like "www", "com" or a popular hashtag are only segmented once per process.
+
+_worker_segment: Optional[Callable[[str], str]] = None
+_worker_mode = "best"
+
+TOKEN_RE = re.compile(r"[A-Za-z]+|[^A-Za-z]+")
+
+
+def _init_worker(mode: str, cache_size: int, words: Optional[List[str]] = None) -> None:
+    global _worker_segment, _worker_mode
+    segmenter = WordSegmenter(w.lower() for w in (words or read_dictionary()))
+    _worker_mode = mode
+
+    @lru_cache(maxsize=cache_size)
+    def segment_run(run: str) -> str:
+        if mode == "count":
+            return str(segmenter.count(run))
+        best = segmenter.best(run)
+        return best if best is not None else run
+
+    _worker_segment = segment_run
+
+
+def _segment_line(line: str) -> str:
+    """Segment each letter run of one input line, pass other chars through."""
+    assert _worker_segment is not None
+    line = line.rstrip("\n")
+    pieces = TOKEN_RE.findall(line)
+    # same letters as TOKEN_RE: non-ASCII letters like "é" pass through
+    if _worker_mode == "count":
+        total = 1
+        for piece in pieces:
+            if piece[0] in string.ascii_letters:
+                total *= int(_worker_segment(piece.lower()))
+        return f"{line}\t{total}"
+    out = [_worker_segment(p.lower()) if p[0] in string.ascii_letters else p for p in pieces]
+    return f"{line}\t{''.join(out)}"
+
+
+def run_stream(
+    lines: Iterable[str],
+    mode: str = "best",
+    workers: Optional[int] = None,
+    cache_size: int = 100_000,
+    chunksize: int = 1000,
+    words: Optional[List[str]] = None,
+) -> Iterator[str]:
+    """
+    Segment a stream of lines in worker processes, yielding results in order.
+    words defaults to the ubuntu word list.
+    """
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(mode, cache_size, words)
+    ) as pool:
+        yield from pool.imap(_segment_line, lines, chunksize=chunksize)
+
+
+def stream_main(args: argparse.Namespace) -> None:
+    source = sys.stdin if args.stream == "-" else open(args.stream)
+    count = 0
+    t0 = time.perf_counter()
+    with source:
+        for result in run_stream(
+            source, args.mode, args.workers, args.cache_size, args.chunksize
+        ):
+            print(result)
+            count += 1
+            if count % 100_000 == 0:
+                rate = count / (time.perf_counter() - t0)
+                print(f"{count} strings, {rate:,.0f} strings/sec", file=sys.stderr)
+    elapsed = time.perf_counter() - t0
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Segmented {count} strings in {elapsed:.2f}s ({rate:,.0f} strings/sec)",
+        file=sys.stderr,
+    )
+
+
+# Tests for the streaming mode (python -m pytest word_breaks.py)
+TEST_WORDS = ["now", "here", "no", "where", "www", "com", "caf"]
+
+
+def test_segment_line_best() -> None:
+    _init_worker("best", 100, TEST_WORDS)
+    assert _segment_line("www.HereNow.com\n") == "www.HereNow.com\twww.here now.com"
+
+
+def test_segment_line_count() -> None:
+    _init_worker("count", 100, TEST_WORDS)
+    assert _segment_line("nowhere") == "nowhere\t2"
+    assert _segment_line("#nowhere-com") == "#nowhere-com\t2"
+
+
+def test_segment_line_non_ascii() -> None:
+    # "é" is not an ASCII letter run: it passes through and doesn't zero the count
+    _init_worker("best", 100, TEST_WORDS)
+    assert _segment_line("café") == "café\tcafé"
+    _init_worker("count", 100, TEST_WORDS)
+    assert _segment_line("café nowhere") == "café nowhere\t2"
+
+
+def test_run_stream_keeps_order() -> None:
+    lines = ["nowhere", "www.com", "xyz"]
+    results = list(run_stream(lines, "count", workers=2, chunksize=1, words=TEST_WORDS))
+    assert results == ["nowhere\t2", "www.com\t1", "xyz\t0"]
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description='Benchmark word break algorithms')
     parser.add_argument('--repeat', type=int, default=1000000, help='Number of iterations for each benchmark (default: 1000000)')
+    parser.add_argument('--stream', metavar='FILE', help='Segment each line of FILE ("-" for stdin) instead of benchmarking')
+    parser.add_argument('--mode', choices=['best', 'count'], default='best', help='Stream output: best segmentation or number of segmentations (default: best)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --stream (default: all cores)')
+    parser.add_argument('--cache-size', type=int, default=100_000, help='Per-worker LRU cache size for --stream (default: 100000)')
+    parser.add_argument('--chunksize', type=int, default=1000, help='Lines sent to a worker at a time for --stream (default: 1000)')
     args = parser.parse_args()
-    
+
+    if args.stream:
+        stream_main(args)
+        return
+
     s = "nowhere"
     word_list = read_dictionary()
 
@@ -316,6 +443,11 @@ def main() -> None:
             "algorithm_fn": lambda data: find_words_length_pruned(s, data),
             "setup_fn": lambda: prepare_word_data_with_lengths(word_list),
         },
+        {
+            "title": "Aho-Corasick DAG (lazy)",
+            "algorithm_fn": lambda seg: find_words_aho_corasick(s, seg),
+            "setup_fn": lambda: WordSegmenter(word_list),
+        },
     ]
     results = benchmark.run(algorithms, REPEAT=args.repeat)
     print("\nResults for each algorithm:")
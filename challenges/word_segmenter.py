@@ -0,0 +1,207 @@
+"""
+Word break with an Aho-Corasick automaton.
+
+The functions in word_breaks.py return every segmentation as a fully
+materialized list of strings. The number of segmentations can grow
+exponentially with the length of the input, so for long strings (URLs,
+hashtags) that runs out of memory.
+
+Here we compile the dictionary once into an Aho-Corasick automaton, then make
+a single pass over the input to find every dictionary word that occurs in it.
+Those matches form a DAG over string positions (an edge j -> i for every word
+s[j:i]). Every segmentation is a path from 0 to len(s) in that DAG, so we can:
+  - count the segmentations with DP, without building any of them
+  - lazily yield segmentations one at a time from a generator
+  - find the single most likely segmentation (Viterbi) by word frequency
+"""
+
+import math
+from collections import deque
+from typing import Dict, Generator, Iterable, List, Optional
+
+
+class WordSegmenter:
+    """Dictionary compiled into an Aho-Corasick automaton for segmentation."""
+
+    def __init__(
+        self, words: Iterable[str], frequencies: Optional[Dict[str, float]] = None
+    ) -> None:
+        # Automaton stored as parallel lists indexed by node number.
+        # Node 0 is the root (empty prefix).
+        self.children: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.word_len: List[int] = [0]  # length of word ending here, 0 if none
+        self.dict_link: List[int] = [0]  # nearest proper suffix that is a word
+
+        for word in words:
+            if word:
+                self._add_word(word)
+        self._build_links()
+
+        # log-probability of each word, for best(). Without frequencies every
+        # word is equally likely, so the best segmentation is the fewest words.
+        if frequencies:
+            total = sum(frequencies.values())
+            self.log_prob = {w: math.log(f / total) for w, f in frequencies.items() if f > 0}
+            self.unknown_log_prob = math.log(0.5 / total)
+        else:
+            self.log_prob = {}
+            self.unknown_log_prob = -1.0
+
+    def _add_word(self, word: str) -> None:
+        node = 0
+        for char in word:
+            nxt = self.children[node].get(char)
+            if nxt is None:
+                nxt = len(self.children)
+                self.children[node][char] = nxt
+                self.children.append({})
+                self.fail.append(0)
+                self.word_len.append(0)
+                self.dict_link.append(0)
+            node = nxt
+        self.word_len[node] = len(word)
+
+    def _build_links(self) -> None:
+        """BFS over the trie to fill in failure and dictionary-suffix links."""
+        queue = deque(self.children[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.children[node].items():
+                f = self.fail[node]
+                while f and char not in self.children[f]:
+                    f = self.fail[f]
+                target = self.children[f].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                fc = self.fail[child]
+                self.dict_link[child] = fc if self.word_len[fc] else self.dict_link[fc]
+                queue.append(child)
+
+    def build_dag(self, s: str) -> List[List[int]]:
+        """
+        Single pass over s. Returns starts where starts[i] lists every j such
+        that s[j:i] is a dictionary word.
+        """
+        starts: List[List[int]] = [[] for _ in range(len(s) + 1)]
+        node = 0
+        for i, char in enumerate(s, 1):
+            while node and char not in self.children[node]:
+                node = self.fail[node]
+            node = self.children[node].get(char, 0)
+            out = node if self.word_len[node] else self.dict_link[node]
+            while out:
+                starts[i].append(i - self.word_len[out])
+                out = self.dict_link[out]
+        return starts
+
+    def count(self, s: str) -> int:
+        """Number of segmentations of s, computed without enumerating them."""
+        starts = self.build_dag(s)
+        ways = [0] * (len(s) + 1)
+        ways[0] = 1
+        for i in range(1, len(s) + 1):
+            ways[i] = sum(ways[j] for j in starts[i])
+        return ways[len(s)]
+
+    def iter_segmentations(self, s: str) -> Generator[str, None, None]:
+        """Lazily yield every segmentation of s, one string at a time."""
+        n = len(s)
+        starts = self.build_dag(s)
+
+        # Walk the DAG backwards from n so we only follow edges that can
+        # still reach the end of the string (no dead-end exploration).
+        can_finish = [False] * (n + 1)
+        can_finish[n] = True
+        ends: List[List[int]] = [[] for _ in range(n + 1)]
+        for i in range(n, 0, -1):
+            if can_finish[i]:
+                for j in starts[i]:
+                    can_finish[j] = True
+                    ends[j].append(i)
+        if not can_finish[0]:
+            return
+
+        # Explicit DFS stack of (position, index of next edge to try)
+        path: List[str] = []
+        stack = [(0, 0)]
+        while stack:
+            pos, k = stack.pop()
+            if pos == n:
+                yield " ".join(path)
+                if path:
+                    path.pop()
+                continue
+            if k < len(ends[pos]):
+                end = ends[pos][k]
+                stack.append((pos, k + 1))
+                path.append(s[pos:end])
+                stack.append((end, 0))
+            elif path:
+                path.pop()
+
+    def best(self, s: str) -> Optional[str]:
+        """Most likely single segmentation by word frequency, or None."""
+        n = len(s)
+        starts = self.build_dag(s)
+        score = [-math.inf] * (n + 1)
+        back = [-1] * (n + 1)
+        score[0] = 0.0
+        for i in range(1, n + 1):
+            for j in starts[i]:
+                if score[j] == -math.inf:
+                    continue
+                cand = score[j] + self.log_prob.get(s[j:i], self.unknown_log_prob)
+                if cand > score[i]:
+                    score[i] = cand
+                    back[i] = j
+        if score[n] == -math.inf:
+            return None
+        words = []
+        i = n
+        while i > 0:
+            words.append(s[back[i] : i])
+            i = back[i]
+        return " ".join(reversed(words))
+
+
+def find_words_aho_corasick(s: str, segmenter: WordSegmenter) -> List[str]:
+    """Same output as the other word_breaks algorithms, for benchmarking."""
+    return list(segmenter.iter_segmentations(s))
+
+
+# Tests (python -m pytest word_segmenter.py)
+TEST_WORDS = ["now", "here", "no", "where", "a", "b", "ab", "ba"]
+
+
+def test_empty_string() -> None:
+    segmenter = WordSegmenter(TEST_WORDS)
+    # the empty string has exactly one segmentation: no words
+    assert segmenter.count("") == 1
+    assert list(segmenter.iter_segmentations("")) == [""]
+    assert segmenter.best("") == ""
+
+
+def test_no_segmentation() -> None:
+    segmenter = WordSegmenter(TEST_WORDS)
+    assert segmenter.count("nowx") == 0
+    assert list(segmenter.iter_segmentations("nowx")) == []
+    assert segmenter.best("nowx") is None
+
+
+def test_count_matches_enumeration() -> None:
+    segmenter = WordSegmenter(TEST_WORDS)
+    for s in ["nowhere", "abab", "ababa", "nowherenowhere"]:
+        segmentations = list(segmenter.iter_segmentations(s))
+        assert len(segmentations) == len(set(segmentations)) == segmenter.count(s)
+    assert sorted(segmenter.iter_segmentations("nowhere")) == ["no where", "now here"]
+
+
+def test_best_tie_breaking() -> None:
+    # without frequencies the fewest words win; among equally short
+    # segmentations the one with the longest last word is kept
+    segmenter = WordSegmenter(TEST_WORDS)
+    assert segmenter.best("aba") == "a ba"
+    assert segmenter.best("nowhere") == "no where"
+    # frequencies override the tie
+    segmenter = WordSegmenter(TEST_WORDS, {"now": 10, "here": 10, "no": 1, "where": 1})
+    assert segmenter.best("nowhere") == "now here"